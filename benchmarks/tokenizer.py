@@ -0,0 +1,77 @@
+# microbenchmark del conteo de tokens de un turno: python benchmarks/tokenizer.py [mensajes] [rondas] [encoding]
+# solo necesita tiktoken (no carga config ni el bot); tiktoken baja el BPE la primera vez, TIKTOKEN_CACHE_DIR reusa una copia local
+import os
+import sys
+from random import Random
+from timeit import repeat
+import tiktoken
+
+# los mismos campos que cuenta preprocess/tokenizer.py
+keys = ["user", "bot", "func_cont", "url", "documento", "search"]
+
+# frases de los idiomas del bot para que la proporción de caracteres por token se parezca a la de los chats
+frases = {
+    "es": ["¿Me puedes explicar cómo funciona la fotosíntesis en las plantas?", "Claro, la fotosíntesis convierte la luz del sol, el agua y el dióxido de carbono en glucosa y oxígeno.",
+           "Mañana va a llover en Madrid, así que lleva paraguas.", "El precio del teléfono bajó un 15% desde el lanzamiento."],
+    "en": ["Can you summarize the main points of this article about renewable energy?", "Sure, the article argues that solar and wind costs have fallen faster than expected.",
+           "Write a Python function that returns the nth Fibonacci number.", "The weather tomorrow will be sunny with a high of 24 degrees."],
+    "pt": ["Você pode me ajudar a escrever um e-mail para o meu chefe?", "Claro, aqui está uma sugestão de texto formal e direto."],
+    "fr": ["Pouvez-vous traduire ce paragraphe en anglais, s'il vous plaît ?", "Bien sûr, voici la traduction la plus fidèle possible."],
+    "de": ["Kannst du mir erklären, wie ein Verbrennungsmotor funktioniert?", "Natürlich, der Motor wandelt chemische Energie in Bewegungsenergie um."],
+    "it": ["Qual è la differenza tra un virus e un batterio?", "I batteri sono organismi viventi, mentre i virus hanno bisogno di una cellula ospite."],
+    "nl": ["Hoe laat gaat de laatste trein naar Amsterdam?", "De laatste trein vertrekt om kwart over twaalf."],
+    "ru": ["Объясни, пожалуйста, как работает квантовый компьютер.", "Квантовый компьютер использует кубиты, которые могут находиться в суперпозиции."],
+    "ar": ["هل يمكنك أن تشرح لي كيف يعمل الذكاء الاصطناعي؟", "بالطبع، يتعلم الذكاء الاصطناعي من البيانات لاكتشاف الأنماط."],
+    "jp": ["明日の東京の天気を教えてください。", "明日の東京は晴れで、最高気温は二十四度の予報です。"],
+    "zh": ["请帮我写一首关于秋天的短诗。", "秋风轻轻吹过金色的田野，落叶在夕阳下慢慢飘舞。"],
+}
+
+def make_dialog(size, seed=0):
+    random = Random(seed)
+    def text(lang, count):
+        return " ".join(random.choice(frases[lang]) for _ in range(count))
+    dialog = []
+    for index in range(size):
+        # la mitad de los chats en español o inglés, como los idiomas más usados
+        lang = random.choice(["es", "es", "en", "en", *frases])
+        message = {"user": text(lang, random.randint(1, 3)), "bot": text(lang, random.randint(3, 12)), "date": None}
+        if index % 5 == 0:
+            message["func_cont"] = text(lang, random.randint(5, 15))
+        dialog.append(message)
+    return dialog, text("es", 2)
+
+def field_texts(dialog):
+    return [str(value) for message in dialog for key, value in message.items() if key in keys]
+
+def per_message(encoding, dialog, new_message):
+    # un encode por campo desde el bucle de Python, como antes de contar en lote
+    counts = [len(encoding.encode_ordinary(text)) for text in field_texts(dialog)]
+    return counts, len(encoding.encode_ordinary(new_message))
+
+def batched(encoding, dialog, new_message):
+    # todos los campos del turno y el mensaje nuevo en una sola llamada, como tokenizer.fill_counts
+    counts = [len(tokens) for tokens in encoding.encode_ordinary_batch([new_message, *field_texts(dialog)])]
+    return counts[1:], counts[0]
+
+def best(function, rounds):
+    return min(repeat(function, number=rounds, repeat=5)) / rounds
+
+def main(size=50, rounds=200, name="cl100k_base"):
+    encoding = tiktoken.get_encoding(name)
+    dialog, new_message = make_dialog(size)
+    assert batched(encoding, dialog, new_message) == per_message(encoding, dialog, new_message)
+    texts = field_texts(dialog)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"{name}: {size} mensajes, {len(texts) + 1} textos, {sum(map(len, texts))} caracteres, {cpus} CPU, {rounds} turnos, mejor de 5")
+    antes = best(lambda: per_message(encoding, dialog, new_message), rounds)
+    despues = best(lambda: batched(encoding, dialog, new_message), rounds)
+    print(f"por mensaje {antes * 1000:.3f} ms/turno, en lote {despues * 1000:.3f} ms/turno, x{antes / despues:.2f}")
+    # referencia para "chars_per_token"/"bytes_per_token" de los modelos sin tokenizer conocido
+    for lang, muestras in [*frases.items(), ("diálogo", texts)]:
+        tokens = sum(len(encoding.encode_ordinary(text)) for text in muestras)
+        caracteres = sum(map(len, muestras))
+        octetos = sum(len(text.encode()) for text in muestras)
+        print(f"{lang:>8}: {caracteres / tokens:.2f} chars/token, {octetos / tokens:.2f} bytes/token")
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]), *sys.argv[3:4])
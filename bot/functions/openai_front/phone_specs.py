@@ -2,7 +2,7 @@ from bot.src.utils.constants import ERRFUNC, FUNCNOARG
 from bot.src.utils.gen_utils.openai.openai_functions_extraction import openaifunc
 
 from bot.src.apis import smart_gsm
-@openaifunc
+@openaifunc(ttl=24 * 60 * 60)
 async def search_smartphone_info(self, model: str) -> str:
     """
     Receives the device name and makes a search in the smart_gsm website returning all the device info.
@@ -1,7 +1,7 @@
 from bot.src.utils.constants import ERRFUNC, FUNCNOARG
 from bot.src.utils.gen_utils.openai.openai_functions_extraction import openaifunc
 from bot.src.apis import wttr
-@openaifunc
+@openaifunc(ttl=15 * 60)
 async def lookup_weather(self, location: str, unit: str) -> str:
     """
     Search actual weather info.
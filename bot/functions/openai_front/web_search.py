@@ -1,7 +1,7 @@
 from bot.src.utils.constants import ERRFUNC, FUNCNOARG
 from bot.src.utils.gen_utils.openai.openai_functions_extraction import openaifunc
 from bot.src.apis import duckduckgo
-@openaifunc
+@openaifunc(ttl=10 * 60, vary=("lang",))
 async def search_on_internet(self, query: str, search_type: str, timelimit: str = None) -> str:
     """
     Search information/recommendations and news on internet
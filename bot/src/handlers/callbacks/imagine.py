@@ -1,7 +1,6 @@
-from udatetime import now
 from bot.src.start import Update, CallbackContext
 from bot.src.handlers.menu import handle as hh, get as gg, refresh as rr
-from bot.src.utils.proxies import obtener_contextos as oc, config, db, imaginepy_ratios_cache, imaginepy_styles_cache, imaginepy_models_cache,ParseMode,errorpredlang,menusnotready
+from bot.src.utils.proxies import obtener_contextos as oc, config, db,ParseMode,errorpredlang,menusnotready
 from bot.src.utils.constants import constant_db_imaginepy_ratios, constant_db_imaginepy_styles, constant_db_imaginepy_models, logger
 
 async def handle(update: Update, context: CallbackContext):
@@ -25,16 +24,13 @@ async def admin_selecciones(propsmenu, seleccion, chat):
     if propsmenu == "set_imaginepy_ratios":
         menu_type = "imaginepy_ratios"
         if seleccion != "paginillas":
-            imaginepy_ratios_cache[chat.id] = (seleccion, now())
             await db.set_chat_attribute(chat, f'{constant_db_imaginepy_ratios}', seleccion)
     elif propsmenu == "set_imaginepy_styles":
         menu_type = "imaginepy_styles"
         if seleccion != "paginillas":
-            imaginepy_styles_cache[chat.id] = (seleccion, now())
             await db.set_chat_attribute(chat, f'{constant_db_imaginepy_styles}', seleccion)
     elif propsmenu == "set_imaginepy_models":
         menu_type = "imaginepy_models"
         if seleccion != "paginillas":
-            imaginepy_models_cache[chat.id] = (seleccion, now())
             await db.set_chat_attribute(chat, f'{constant_db_imaginepy_models}', seleccion)
     return menu_type
\ No newline at end of file
@@ -19,4 +19,4 @@ async def handle(update: Update, context: CallbackContext):
             task.cancel()
             await tasks.releasemaphore(chat)
             interaction_cache[chat.id] = ("visto", now())
-            await db.set_chat_attribute(chat, "last_interaction", now())
\ No newline at end of file
+            await db.set_last_interaction(chat, now())
\ No newline at end of file
@@ -9,15 +9,14 @@ from bot.src.utils.proxies import debe_continuar, obtener_contextos as oc, bb, d
 from bot.src.handlers import semaphore as tasks
 from bot.src.handlers.error import mini_handle as handle_errors
 from bot.src.utils.constants import logger
+from bot.src.utils.imagestore import ImageStore
 #algunos mensajes de error
 rmnf = "Replied message not found"
 
-document_groups = {}  # Almacena todos los document_groups con su message_id
-async def remove_document_group(message_id, borrar=None, update=None, lang=None):
-    if not borrar:
-        await asyncio.sleep(config.generatedimagexpiration * 60)  # Espera (# * 60 segundos)
-    if f'{message_id}' in document_groups:
-        del document_groups[f'{message_id}']
+# document_groups por message_id; tasks/images.py borra los que expiran
+document_groups = ImageStore("document_groups", config.generated_image_groups, config.generatedimagexpiration * 60, config.generated_image_ram * 1024 * 1024)
+async def remove_document_group(message_id, update=None, lang=None):
+    if document_groups.remove(f'{message_id}'):
         if lang:
             msg = await update.effective_chat.send_message(text=f'{config.lang[lang]["mensajes"]["fotos_borradas_listo"]}')
             await asyncio.sleep(3)
@@ -26,8 +25,7 @@ async def remove_document_group(message_id, borrar=None, update=None, lang=None)
 async def create_document_group(update, context, lang, image_group, document_group, mensaje_group_id, chattype=None, caption=None):
     try:
         await chattype.chat.send_action(ChatAction.UPLOAD_PHOTO)
-        document_groups[f'{mensaje_group_id}'] = document_group
-        asyncio.create_task(remove_document_group(message_id=f'{mensaje_group_id}', update=update))
+        document_groups.put(f'{mensaje_group_id}', document_group)
         keyboard = []
         keyboard.append([])
         keyboard[0].append({"text": "🗑", "callback_data": f"imgdownload|{mensaje_group_id}|borrar"})
@@ -125,20 +123,17 @@ async def send_image_group(update, context, lang, chat, image_urls, chattype, cu
             image_urls.seek(0)  # Ensure we're at the start of the file
             image = InputMediaPhoto(image_urls)
             image_group.append(image)
-            image_urls.seek(0)
-            document = InputMediaDocument(image_urls, filename="imagen.png")
-            document_group.append(document)
+            document_group.append((image_urls.getvalue(), "imagen.png"))
         else:
             for i, image_url in enumerate(image_urls):
                 caption = f'✏️ "<strong><code>{prompt}</code></strong>"\n\n🧵 <strong>{config.api["info"][current_api]["name"]}</strong>\n🎨 <strong>{style}</strong>'
                 image = InputMediaPhoto(image_url)
                 image_group.append(image)
-                document = InputMediaDocument(image_url, filename=f"imagen_{i}.png")
-                document_group.append(document)
+                document_group.append((image_url, f"imagen_{i}.png"))
         mensaje_group_id = update.effective_message.message_id
         await create_document_group(update, context, lang, image_group, document_group, mensaje_group_id, chattype, caption)
         interaction_cache[chat.id] = ("visto", now())
-        await db.set_chat_attribute(chat, "last_interaction", now())
+        await db.set_last_interaction(chat, now())
     except Exception as e:
         if "referenced before assignment" in str(e):
             await chattype.reply_text(f'{config.lang[lang]["errores"]["genimagen_badrequest"]}', parse_mode=ParseMode.HTML)
@@ -167,7 +162,6 @@ async def handle(chat, lang, update, context, _message=None):
         await tasks.releasemaphore(chat=chat)
 
 #callback de recibir o borrar imagenes
-pendientes = {}
 async def callback(update: Update, context: CallbackContext):
     from bot.src.utils.proxies import obtener_contextos as oc, config
     query = update.callback_query
@@ -178,7 +172,7 @@ async def callback(update: Update, context: CallbackContext):
     if action == "recibir":
         await callback_recibir(update, context, msgid, lang)
     elif action == "borrar":
-        asyncio.create_task(remove_document_group(message_id=msgid, borrar=True, update=update, lang=lang))
+        asyncio.create_task(remove_document_group(message_id=msgid, update=update, lang=lang))
     await query.message.delete()
 
 async def expiracion(update, lang, msgid=None):
@@ -194,18 +188,19 @@ async def callback_recibir(update, context, msgid, lang):
     documentos = document_groups.get(f'{msgid}')
     if not documentos:
         await expiracion(update, lang, msgid)
-    else:
+    elif msgid not in document_groups.pending:
+        document_groups.pending.add(msgid)
+        documentos = [InputMediaDocument(media, filename=filename) for media, filename in documentos]
         try:
-            if not pendientes.get(msgid):
-                pendientes[msgid] = True
-                await send_media_group_with_retry(update, None, context, update.effective_message.chat.id, documentos, keyboard=None, reply_to_message_id=msgid, lang=lang)
-                await remove_document_group(message_id=msgid, borrar=True)
-                pendientes.pop(msgid)
+            await send_media_group_with_retry(update, None, context, update.effective_message.chat.id, documentos, keyboard=None, reply_to_message_id=msgid, lang=lang)
+            await remove_document_group(message_id=msgid)
         except telegram.error.BadRequest as e:
             if rmnf in str(e):
                 await send_media_group_with_retry(update, None, context, update.effective_message.chat.id, documentos, keyboard=None, lang=lang)
             else:
                 raise ValueError(f"telegram BadRequest > {e}")
+        finally:
+            document_groups.pending.discard(msgid)
 
 
 from bot.src.handlers.menu import handle as hh, get as gg, refresh as rr
@@ -223,7 +218,6 @@ async def options_callback(update: Update, context: CallbackContext):
 
 async def options_set(update: Update, context: CallbackContext):
     from bot.src.utils.constants import constant_db_image_api, constant_db_image_api_styles
-    from bot.src.utils.proxies import image_api_cache, image_api_styles_cache
     chat, _ = await oc(update)
     query, propsmenu, seleccion, page_index, _ = await hh(update)
     menu_type="image_api"
@@ -231,12 +225,10 @@ async def options_set(update: Update, context: CallbackContext):
         menu_type="imaginepy"
     if seleccion != "image_api":
         menu_type="image_api_styles"
-    if seleccion in img_vivas and (image_api_cache.get(chat.id) is None or image_api_cache.get(chat.id)[0] != seleccion):
-        image_api_cache[chat.id] = (seleccion, now())
+    if seleccion in img_vivas and (await db.load_settings(chat)).image_api != seleccion:
         await db.set_chat_attribute(chat, f'{constant_db_image_api}', seleccion)
     elif propsmenu == "set_image_api_styles":
         menu_type = "image_api_styles"
         if seleccion != "paginillas":
-            image_api_styles_cache[chat.id] = (seleccion, now())
             await db.set_chat_attribute(chat, f'{constant_db_image_api_styles}', seleccion)
     await rr(query, update, context, page_index, menu_type=menu_type, chat=chat)
\ No newline at end of file
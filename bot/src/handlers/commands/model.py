@@ -1,4 +1,3 @@
-from udatetime import now
 from bot.src.start import Update, CallbackContext
 from bot.src.handlers.menu import handle as hh, get as gg, refresh as rr
 from bot.src.utils.constants import constant_db_model, logger
@@ -14,11 +13,10 @@ async def callback(update: Update, context: CallbackContext):
     query, _, _, page_index, _ = await hh(update)
     await rr(query, update, context, page_index, menu_type="model")
 async def set(update: Update, context: CallbackContext):
-    from bot.src.utils.proxies import obtener_contextos as oc,model_cache,db, config
+    from bot.src.utils.proxies import obtener_contextos as oc,db, config
     chat, _ = await oc(update)
     query, _, seleccion, page_index, _ = await hh(update)
     menu_type="model"
-    if seleccion in config.model["available_model"] and (model_cache.get(chat.id) is None or model_cache.get(chat.id)[0] != seleccion):
-        model_cache[chat.id] = (seleccion, now())
+    if seleccion in config.model["available_model"] and (await db.load_settings(chat)).model != seleccion:
         await db.set_chat_attribute(chat, f'{constant_db_model}', seleccion)
     await rr(query, update, context, page_index, menu_type=menu_type, chat=chat)
\ No newline at end of file
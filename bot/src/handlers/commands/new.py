@@ -17,6 +17,6 @@ async def handle(update: Update, context: CallbackContext, msgid=None):
         #Bienvenido!
         await update.effective_chat.send_message(f"{config.chat_mode['info'][mododechat_actual]['welcome_message'][lang]}", parse_mode=ParseMode.HTML) if not msgid else None
         interaction_cache[chat.id] = ("visto", now())
-        await db.set_chat_attribute(chat, "last_interaction", now())
+        await db.set_last_interaction(chat, now())
     except Exception as e: logger.error(f'{__name__}: <new_dialog_handle> {errorpredlang}: {e}')
     finally: await tasks.releasemaphore(chat=chat)
\ No newline at end of file
@@ -12,7 +12,7 @@ async def handle(update: Update, context: CallbackContext):
     last_dialog_message = dialog_messages.pop()
     await db.set_dialog_messages(chat, dialog_messages, dialog_id=None)  # last message was removed from the context
     interaction_cache[chat.id] = ("visto", now())
-    await db.set_chat_attribute(chat, "last_interaction", now())
+    await db.set_last_interaction(chat, now())
     await tasks.releasemaphore(chat=chat)
     _message = last_dialog_message.get("user", None)
     if not _message:
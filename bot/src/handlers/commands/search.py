@@ -33,7 +33,7 @@ async def handle(chat, lang, update, context, _message=None):
                 formatted_results_string = f'{config.lang[lang]["metagen"]["advertencia"]}: {config.lang[lang]["errores"]["advertencia_tokens_excedidos"]}\n\n{formatted_results_string}'
             await send_large_message(formatted_results_string, update)
             interaction_cache[chat.id] = ("visto", now())
-            await db.set_chat_attribute(chat, "last_interaction", now())
+            await db.set_last_interaction(chat, now())
         except telegram.error.BadRequest:
             text = f'{config.lang[lang]["errores"]["genimagen_badrequest"]}'
             await update.effective_chat.send_message(text, parse_mode=ParseMode.HTML)
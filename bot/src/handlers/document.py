@@ -4,7 +4,7 @@ from . import semaphore as tasks
 from tempfile import TemporaryDirectory
 from pathlib import Path
 from bot.src.utils.misc import clean_text, update_dialog_messages
-from bot.src.utils.proxies import (ChatAction, ParseMode, config, interaction_cache, db)
+from bot.src.utils.proxies import (ChatAction, ParseMode, config, interaction_cache, db, file_cache)
 
 async def handle(chat, lang, update, context):
     try:
@@ -12,23 +12,17 @@ async def handle(chat, lang, update, context):
         file_size_mb = document.file_size / (1024 * 1024)
         if file_size_mb <= config.file_max_size:
             await update.effective_chat.send_action(ChatAction.TYPING)
-            with TemporaryDirectory() as tmp_dir:
-                tmp_dir = Path(tmp_dir)
-                ext = document.file_name.split(".")[-1]
-                doc_path = tmp_dir / Path(document.file_name)
-                # download
-                doc_file = await context.bot.get_file(document.file_id)
-                await doc_file.download_to_drive(doc_path)
-                doc = await process_document(update, doc_path, ext, chat, lang)
-                text = f'{config.lang[lang]["mensajes"]["document_anotado_ask"]}'
-                if doc[2]==True:
-                    text = f'{config.lang[lang]["metagen"]["advertencia"]}: {config.lang[lang]["errores"]["advertencia_tokens_excedidos"]}\n\n{text}'
+            ext = document.file_name.split(".")[-1]
+            doc = await process_document(update, context, document, ext, chat, lang)
+            text = f'{config.lang[lang]["mensajes"]["document_anotado_ask"]}'
+            if doc[2]==True:
+                text = f'{config.lang[lang]["metagen"]["advertencia"]}: {config.lang[lang]["errores"]["advertencia_tokens_excedidos"]}\n\n{text}'
 
-                new_dialog_message = {"documento": f"{document.file_name} -> content: {doc[0]}", "date": now()}
-                await update_dialog_messages(chat, new_dialog_message)
+            new_dialog_message = {"documento": f"{document.file_name} -> content: {doc[0]}", "date": now()}
+            await update_dialog_messages(chat, new_dialog_message)
 
-                interaction_cache[chat.id] = ("visto", now())
-                await db.set_chat_attribute(chat, "last_interaction", now())
+            interaction_cache[chat.id] = ("visto", now())
+            await db.set_last_interaction(chat, now())
         else:
             text = config.lang[lang]["errores"]["document_size_limit"].replace("{file_size_mb}", f"{file_size_mb:.2f}").replace("{file_max_size}", str(config.file_max_size))
     except Exception as e:
@@ -37,23 +31,39 @@ async def handle(chat, lang, update, context):
         await tasks.releasemaphore(chat=chat)
         await update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
-async def process_document(update, doc_path, ext, chat, lang):
-    if "pdf" in ext:
-        doc = await process_pdf(update, doc_path, lang)
-    else:
-        with open(doc_path, 'r') as f:
-            doc = f.read()
-    return await clean_text(doc, chat)
+async def process_document(update, context, document, ext, chat, lang):
+    # el mismo archivo reenviado no se vuelve a descargar ni a extraer; el texto de los pdf depende del idioma
+    key = f'pdf:{lang}:{config.pdf_page_lim}:{document.file_unique_id}' if "pdf" in ext else f'doc:{document.file_unique_id}'
+    cached = await file_cache.get(key)
+    if cached is None:
+        with TemporaryDirectory() as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            doc_path = tmp_dir / Path(document.file_name)
+            # download
+            doc_file = await context.bot.get_file(document.file_id)
+            await doc_file.download_to_drive(doc_path)
+            if "pdf" in ext:
+                doc, omitidas = await process_pdf(doc_path, lang)
+            else:
+                with open(doc_path, 'r') as f:
+                    doc = f.read()
+                omitidas = 0
+        cached = {"text": doc, "omitidas": omitidas}
+        await file_cache.put(key, cached)
+    if cached["omitidas"]:
+        await update.message.reply_text(f'{config.lang[lang]["errores"]["pdf_pages_limit"].format(paginas=cached["omitidas"], pdf_page_lim=int(config.pdf_page_lim))}', parse_mode=ParseMode.HTML)
+    return await clean_text(cached["text"], chat)
 
-async def process_pdf(update, doc_path, lang):
+async def process_pdf(doc_path, lang):
     pdf_file = open(doc_path, 'rb')
     from PyPDF2 import PdfReader
     read_pdf = PdfReader(pdf_file)
     doc = ''
     lim = int(config.pdf_page_lim)
     paginas = int(len(read_pdf.pages))
+    omitidas = 0
     if int(paginas) > int(lim):
-        await update.message.reply_text(f'{config.lang[lang]["errores"]["pdf_pages_limit"].format(paginas=(paginas - lim), pdf_page_lim=int(lim))}', parse_mode=ParseMode.HTML)
+        omitidas = paginas - lim
         paginas = int(lim)
     for i in range(paginas):
         text = read_pdf.pages[i].extract_text()
@@ -64,7 +74,7 @@ async def process_pdf(update, doc_path, lang):
             if len(para) > 3:
                 doc += f'{config.lang[lang]["metagen"]["paginas"]}{i+1}_{config.lang[lang]["metagen"]["parrafos"]}{parafo_count}: {para}\n\n'      
                 parafo_count += 1
-    return doc
+    return doc, omitidas
 
 async def wrapper(update: Update, context: CallbackContext):
     from bot.src.utils.proxies import (debe_continuar,obtener_contextos as oc, parametros, bb)
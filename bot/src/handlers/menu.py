@@ -1,9 +1,9 @@
 from bot.src.start import Update, CallbackContext
 from udatetime import now
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from bot.src.utils import proxies
 from bot.src.utils.proxies import menu_cache, config, db, obtener_contextos as oc, parametros, interaction_cache, msg_no_mod, ParseMode, telegram, errorpredlang
 from bot.src.utils import constants
+from bot.src.utils.constants import logger
 
 async def get(menu_type, update: Update, context: CallbackContext, chat, page_index):
     try:
@@ -18,9 +18,11 @@ async def get(menu_type, update: Update, context: CallbackContext, chat, page_in
         else:
             option_name = await get_option_name(menu_type, menu_type_dict, lang, current_key)
         text = await get_text(update, context, chat, lang, menu_type, menu_type_dict, option_name, current_key)
-        item_keys = await get_menu_item_keys(menu_type, chat, lang, update)
-        item_keys.remove("imagen") if config.switch_imgs != True and "imagen" in item_keys else None
-        keyboard = await get_keyboard(item_keys, page_index, menu_type, menu_type_dict, lang)
+        api_actual = None
+        if menu_type == "model":
+            _, api_actual, _, _, _, _, _ = await parametros(chat, lang, update)
+        item_keys = await get_menu_item_keys(menu_type, api_actual)
+        keyboard = await get_keyboard(item_keys, page_index, menu_type, menu_type_dict, lang, api_actual)
         reply_markup = InlineKeyboardMarkup(keyboard)
         return text, reply_markup
     except Exception as e: print(f'{__name__}: {errorpredlang}: <get_menu> <{menu_type}, {option_name}, {current_key}> {e}')
@@ -47,11 +49,7 @@ async def get_current_key(menu_type, chat):
     try:
         constant_name = "constant_db_" + menu_type
         constant_value = constants.__dict__[constant_name]
-        cache_variable = getattr(proxies, f"{menu_type}_cache")
-        if chat.id in cache_variable: current_key = cache_variable[chat.id][0]
-        else: current_key = await db.get_chat_attribute(chat, constant_value)
-        cache_variable[chat.id] = (current_key, now())
-        return current_key
+        return (await db.load_settings(chat)).get(constant_value)
     except Exception as e:
         raise ValueError(f'<get_current_key> {e}')
 
@@ -145,7 +143,7 @@ async def get_text(update, context, chat, lang, menu_type, menu_type_dict, optio
         raise KeyError(f"get_text: {e}")
 
 
-async def get_menu_item_keys(menu_type, chat, lang, update):
+async def get_menu_item_keys(menu_type, api=None):
     from bot.src.tasks.apis_chat import vivas as apis_vivas
     from bot.src.tasks.apis_image import img_vivas
     menu_items = {
@@ -162,23 +160,30 @@ async def get_menu_item_keys(menu_type, chat, lang, update):
     }
     try:
         if menu_type == "model":
-            _, api_actual, _, _, _, _, _ = await parametros(chat, lang, update)
-            return config.api["info"][api_actual]["available_model"]
+            return config.api["info"][api]["available_model"]
+        if menu_type == "chat_mode" and config.switch_imgs != True:
+            return [key for key in menu_items[menu_type] if key != "imagen"]
         return menu_items.get(menu_type)
     except Exception as e:
         raise KeyError(f"<get_menu_item_keys> {e}")
 
-def convert_dict_to_immutable(d):
-    if isinstance(d, dict): return frozenset((k, convert_dict_to_immutable(v)) for k, v in d.items())
-    elif isinstance(d, list): return tuple(convert_dict_to_immutable(x) for x in d)
-    return d
-
-async def get_keyboard(item_keys, page_index, menu_type, menu_type_dict, lang):
+def get_item_version(menu_type, api=None):
+    # las opciones de api e image_api cambian con las apis vivas; model depende de la api; el resto sale de config
+    from bot.src.tasks import apis_chat, apis_image
+    if menu_type == "api":
+        return apis_chat.version
+    if menu_type == "image_api":
+        return apis_image.img_version
+    if menu_type == "model":
+        return api
+    return None
+
+async def get_keyboard(item_keys, page_index, menu_type, menu_type_dict, lang, api=None):
     try:
-        menu_type_dict_immutable = convert_dict_to_immutable(menu_type_dict)
-        cache_key = (tuple(item_keys), page_index, menu_type, menu_type_dict_immutable, lang)
+        cache_key = (menu_type, page_index, lang, get_item_version(menu_type, api))
 
-        if cache_key in menu_cache: return menu_cache[cache_key]
+        keyboard = menu_cache.get(cache_key)
+        if keyboard is not None: return keyboard
         else:
             from itertools import islice
             per_page = config.itemspage
@@ -271,6 +276,23 @@ async def get_navigation_buttons(keyboard, item_keys, page_index, menu_type, lan
         return keyboard
     except Exception as e: raise KeyError(f"get_navigation_buttons: {e}")
 
+async def prebuild():
+    # todas las páginas de todos los menús en cada idioma
+    from math import ceil
+    built = 0
+    for lang in config.available_lang:
+        for menu_type in ["api", "chat_mode", "lang", "props", "image_api", "image_api_styles", "imaginepy", "imaginepy_styles", "imaginepy_ratios", "imaginepy_models", "model"]:
+            for api in (config.api["available_api"] if menu_type == "model" else [None]):
+                try:
+                    item_keys = await get_menu_item_keys(menu_type, api)
+                    menu_type_dict = await get_menu_type_dict(menu_type)
+                    for page_index in range(max(1, ceil(len(item_keys) / config.itemspage))):
+                        await get_keyboard(item_keys, page_index, menu_type, menu_type_dict, lang, api)
+                        built += 1
+                except Exception as e:
+                    logger.error(f'{__name__}: <prebuild> {menu_type} {lang} {api}: {e}')
+    return built
+
 async def handle(update: Update):
     try:
         query = update.callback_query
@@ -290,7 +312,7 @@ async def refresh(query, update, context, page_index, menu_type, chat=None):
         text, reply_markup = await get(*argus)
         await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
         interaction_cache[chat.id] = ("visto", now())
-        await db.set_chat_attribute(chat, "last_interaction", now())
+        await db.set_last_interaction(chat, now())
     except telegram.error.BadRequest as e:
         if str(e).startswith(msg_no_mod): None
         else: raise ValueError(f'refresh: {e}')
\ No newline at end of file
@@ -1,4 +1,4 @@
-from bot.src.utils.proxies import (debe_continuar, obtener_contextos as oc, parametros, chat_mode_cache, model_cache, bb, db, interaction_cache, msg_no_mod, sleep, config, ParseMode, ChatAction, telegram, user_names, asyncio, errorpredlang)
+from bot.src.utils.proxies import (debe_continuar, obtener_contextos as oc, parametros, bb, db, interaction_cache, msg_no_mod, sleep, config, ParseMode, ChatAction, telegram, user_names, asyncio, errorpredlang)
 from bot.src.utils.constants import logger
 from nltk import download as ddl
 if config.proxy_raw is not None:
@@ -6,13 +6,15 @@ if config.proxy_raw is not None:
     set_proxy(config.proxy_raw)
 from nltk.corpus import names as cc
 ddl('names', quiet=True)
-from secrets import choice
+from secrets import randbelow
+from array import array
+from collections import OrderedDict
 
 from bot.src.start import Update, CallbackContext
 from bot.src.utils.gen_utils.phase import ChatGPT
 from bot.src.utils.checks.c_message import check as check_message
 from bot.src.utils.misc import update_dialog_messages
-from bot.src.utils.constants import constant_db_model, constant_db_chat_mode, continue_key
+from bot.src.utils.constants import continue_key
 
 from bot.src.handlers import semaphore as tasks
 from udatetime import now, from_string
@@ -32,11 +34,46 @@ async def wrapper(update: Update, context: CallbackContext):
     except Exception as e: logger.error(f'{__name__}: <message_handle_wrapper> {errorpredlang}: {e}')
 
 
+# el corpus se carga una vez: todos los nombres en un solo str y dónde empieza cada uno
+names_text = ""
+names_offsets = array("I")
+
 async def get_random_name():
-    # Generar un nombre aleatorio similar a los nombres mencionados
-    names = cc.words()
-    name = choice(names)
-    return name
+    global names_text
+    if not names_offsets:
+        names_text = "\n".join(cc.words())
+        names_offsets.append(0)
+        names_offsets.extend(index + 1 for index, char in enumerate(names_text) if char == "\n")
+    index = randbelow(len(names_offsets))
+    end = names_offsets[index + 1] - 1 if index + 1 < len(names_offsets) else len(names_text)
+    return names_text[names_offsets[index]:end]
+
+async def get_user_name(chat, user_id):
+    # LRU de alias por chat, guardado en el chat para que no cambie al reiniciar
+    aliases = user_names.get(chat.id)
+    user_id = str(user_id)
+    if aliases is None or user_id not in aliases:
+        # lo guardado puede tener alias que puso otro worker
+        stored = await db.get_chat_attribute(chat, "user_names") or {}
+        if aliases is None:
+            aliases = OrderedDict(stored)
+            user_names[chat.id] = aliases
+        else:
+            for stored_id, name in stored.items():
+                aliases.setdefault(stored_id, name)
+    if user_id in aliases:
+        aliases.move_to_end(user_id)
+        return aliases[user_id]
+    # Generar un nombre aleatorio y asignarlo al usuario
+    aliases[user_id] = await get_random_name()
+    if len(aliases) > config.user_names_per_chat:
+        while len(aliases) > config.user_names_per_chat:
+            aliases.popitem(last=False)
+        await db.set_chat_attribute(chat, "user_names", dict(aliases))
+    else:
+        # solo la entrada nueva: no pisa los alias que otro worker haya agregado
+        await db.set_chat_entry(chat, "user_names", user_id, aliases[user_id])
+    return aliases[user_id]
 
 async def process_message(update, context, chat, _message=None):
     if _message:
@@ -45,55 +82,40 @@ async def process_message(update, context, chat, _message=None):
     else:
         raw_msg, _message = await check_message(update, _message)
         if chat.type != "private":
-            user_id = raw_msg.from_user.id
-            if user_id in user_names:
-                user_name = user_names[user_id]
-            else:
-                # Generar un nombre aleatorio y asignarlo al usuario
-                user_name = await get_random_name()
-                user_names[user_id] = user_name
+            user_name = await get_user_name(chat, raw_msg.from_user.id)
             _message = _message.replace("@" + context.bot.username, "").strip()
             _message = f"@{user_name}: {_message}"
     return raw_msg, _message
 
 async def handle(chat, lang, update, context, _message=None, msgid=None):
     try:
-        await parametros(chat, lang, update)
+        # los valores ya comprobados: si un ajuste no era válido, el check lo cambió también en settings
+        chat_mode, _, current_model, _, _, _, _ = await parametros(chat, lang, update)
         raw_msg, _message = await process_message(update, context, chat, _message)
         await process_urls(raw_msg, chat, lang, update)
-        if chat.id in chat_mode_cache and chat.id in interaction_cache and chat.id in model_cache:
-            chat_mode = chat_mode_cache.get(chat.id)[0]
-            current_model = model_cache[chat.id][0]
-            last_interaction = interaction_cache[chat.id][1]
-        else:
-            db_args = [constant_db_chat_mode, "last_interaction", constant_db_model]
-            db_call = await db.get_chat_attributes_dict(chat, db_args)
-            
-            chat_mode = db_call[constant_db_chat_mode]
-            last_interaction = db_call["last_interaction"]
-            current_model = db_call[constant_db_model]
-
-        chat_mode_cache[chat.id] = (chat_mode, now())
-        model_cache[chat.id] = (current_model, now())
+        # ajustes del chat cargados una sola vez para todo el update
+        settings = await db.load_settings(chat)
+        last_interaction = settings.last_interaction
         if isinstance(last_interaction, str):
             last_interaction = from_string(last_interaction)
 
-        dialog_messages = await db.get_dialog_messages(chat, dialog_id=None)
-        if (now() - last_interaction).seconds > config.dialog_timeout and len(dialog_messages) > 0:
+        # los mensajes solo se leen si el diálogo ya caducó
+        if (now() - last_interaction).seconds > config.dialog_timeout and len(await db.get_dialog_messages(chat, settings.current_dialog_id)) > 0:
             if config.timeout_ask:
                 await timeout.ask(chat, lang, update, _message)
                 return
             else:
                 await new.handle(update, context)
+                settings = await db.load_settings(chat)
                 await update.effective_chat.send_message(f'{config.lang[lang]["mensajes"]["timeout_ask_false"].format(chatmode=config.chat_mode["info"][chat_mode]["name"][lang])}', parse_mode=ParseMode.HTML)
 
         await tasks.releasemaphore(chat=chat)
-        task = bb(gen(update, context, _message, chat, lang, chat_mode, current_model, msgid))
+        task = bb(gen(update, context, _message, chat, lang, chat_mode, current_model, msgid, settings))
         await tasks.handle(chat, task)
     except Exception as e:
         await handle_errors(f'message_handle > {e}', lang, chat)
 
-async def gen(update, context, _message, chat, lang, chat_mode, current_model, msgid=None):
+async def gen(update, context, _message, chat, lang, chat_mode, current_model, msgid=None, settings=None):
     # Verificar si el mensaje está vacío
     if await verificar_mensaje_y_enviar_error_si_vacio(_message, update, lang): return
     # Configurar modo de análisis de mensajes
@@ -106,7 +128,7 @@ async def gen(update, context, _message, chat, lang, chat_mode, current_model, m
     placeholder_message = await update.effective_chat.send_message("🤔...",  reply_markup={"inline_keyboard": keyboard}, reply_to_message_id=reply_val)
     try:
         try:
-            _message, answer = await stream_message(update, context, chat, lang, current_model, _message, chat_mode, parse_mode, keyboard, placeholder_message)
+            _message, answer = await stream_message(update, context, chat, lang, current_model, _message, chat_mode, parse_mode, keyboard, placeholder_message, settings)
             keyboard = await get_keyboard(keyboard)
             await context.bot.edit_message_text(answer, chat_id=placeholder_message.chat.id, message_id=placeholder_message.message_id, disable_web_page_preview=True, reply_markup={"inline_keyboard": keyboard}, parse_mode=parse_mode)
         except Exception as e:
@@ -125,13 +147,12 @@ async def gen(update, context, _message, chat, lang, chat_mode, current_model, m
         _message, answer = await check_empty_messages(_message, answer)
         # Actualizar caché de interacciones y historial de diálogos del chat
         interaction_cache[chat.id] = ("visto", now())
-        asyncio.create_task(db.set_chat_attribute(chat, "last_interaction", now()))
         new_dialog_message = {"user": _message, "bot": answer, "date": now()}
-        advertencia, _, _ = await update_dialog_messages(chat, new_dialog_message)
+        advertencia, _ = await update_dialog_messages(chat, new_dialog_message, last_interaction=now(), settings=settings)
         asyncio.create_task(enviar_advertencia_si_necesario(advertencia, update, lang, reply_val))
         await tasks.releasemaphore(chat=chat)
 
-async def stream_message(update, context, chat, lang, current_model, _message, chat_mode, parse_mode, keyboard, placeholder_message):
+async def stream_message(update, context, chat, lang, current_model, _message, chat_mode, parse_mode, keyboard, placeholder_message, settings=None):
     try:
         # Configurar parámetros de actualización
         upd, timer = await get_update_params(chat)
@@ -139,7 +160,7 @@ async def stream_message(update, context, chat, lang, current_model, _message, c
         prev_answer = ""
         answer = ""
         await update.effective_chat.send_action(ChatAction.TYPING)
-        insta = await ChatGPT.create(chat, lang, model=current_model)
+        insta = await ChatGPT.create(chat, lang, model=current_model, settings=settings)
         gen = insta.send_message(_message, chat_mode)
         if config.usar_streaming == False:
             await gen.asend(None)
@@ -1,29 +1,73 @@
-from bot.src.utils.misc import clean_text, update_dialog_messages
+from pathlib import Path
+from time import time
+from bot.src.utils import config
+from bot.src.utils.misc import ver_modelo_get_tokens, update_dialog_messages, tokenizer
+from bot.src.utils.urlcache import UrlCache
 from udatetime import now
 headers = {
     "User-Agent": "Mozilla/5.0 (Android 13; Mobile; rv:109.0) Gecko/113.0 Firefox/113.0"
 }
 
+url_cache = UrlCache(Path("/database/urls"), config.url_cache_size, config.url_cache_disk_mb * 1024 * 1024,
+                     config.url_cache_minutes * 60, config.cache_ttl_minutes * 60)
+
 async def extract_from_url(url: str) -> str:
-    from bot.src.utils.proxies import config
+    return (await fetch_url(url))["text"]
+
+async def fetch_url(url: str) -> dict:
     from aiohttp import ClientSession
     from html2text import HTML2Text
 
+    entry = await url_cache.get(url) if config.url_cache_minutes else None
+    if entry is not None and url_cache.fresh(entry):
+        return entry
+    request_headers = dict(headers)
+    if entry is not None:
+        if entry["etag"]:
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+
     async with ClientSession() as session:
-        async with session.get(url, headers=headers, allow_redirects=True, proxy=config.apisproxy) as response:
+        async with session.get(url, headers=request_headers, allow_redirects=True, proxy=config.apisproxy) as response:
+            if response.status == 304 and entry is not None:
+                entry["checked"] = time()
+                await url_cache.put(entry)
+                return entry
             response.raise_for_status()
             content_length = int(response.headers.get('Content-Length', 0))
             if content_length > config.url_max_size * (1024 * 1024):
                 raise ValueError("lenghtexceed")
             html_content = await response.text()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
 
     text_maker = HTML2Text()
     text_maker.ignore_links = True
     text_maker.ignore_images = True
     text_maker.single_line_break = True
     doc = str(text_maker.handle(html_content))
-    return doc
-    
+    entry = url_cache.new_entry(url, doc, etag, last_modified)
+    if config.url_cache_minutes:
+        await url_cache.put(entry)
+    return entry
+
+async def extract_clean_text(url: str, chat):
+    # el texto ya recortado también se guarda, uno por cada tokenizer y límite de tokens
+    from bot.src.utils.proxies import db
+    entry = await fetch_url(url)
+    settings = await db.load_settings(chat)
+    max_tokens = await ver_modelo_get_tokens(chat, model=settings.model)
+    counter = tokenizer.get(settings.model, settings.api)
+    key = f"{counter.name}:{max_tokens}"
+    if key not in entry["clean"]:
+        doc, tokencount, advertencia = await tokenizer.handle(input_data=entry["text"], max_tokens=max_tokens, counter=counter)
+        entry["clean"][key] = [None if doc == entry["text"] else doc, tokencount, advertencia]
+        if config.url_cache_minutes:
+            await url_cache.put(entry)
+    doc, tokencount, advertencia = entry["clean"][key]
+    return doc if doc is not None else entry["text"], tokencount, advertencia
+
 async def handle(chat, lang, update, urls):
     from bot.src.utils.proxies import config, ChatAction, interaction_cache, db
     textomensaje=""
@@ -33,8 +77,7 @@ async def handle(chat, lang, update, urls):
             textomensaje = None
             if not config.url_ask_before_send:
                 textomensaje = f'{config.lang[lang]["mensajes"]["url_anotado_ask"]}'
-            doc = await extract_from_url(url)
-            doc, _, advertencia = await clean_text(doc, chat)
+            doc, _, advertencia = await extract_clean_text(url, chat)
             if advertencia==True:
                 textomensaje = f'{config.lang[lang]["metagen"]["advertencia"]}: {config.lang[lang]["errores"]["advertencia_tokens_excedidos"]}\n\n{textomensaje if textomensaje else ""}'
             new_dialog_message = {"url": f"{url} -> content: {doc}", "date": now()}
@@ -44,7 +87,7 @@ async def handle(chat, lang, update, urls):
                 textomensaje = f'{config.lang[lang]["errores"]["url_size_limit"]}: {e}'
             else: textomensaje = f'{config.lang[lang]["errores"]["error"]}: {e}'
     interaction_cache[chat.id] = ("visto", now())
-    await db.set_chat_attribute(chat, "last_interaction", now())
+    await db.set_last_interaction(chat, now())
     return textomensaje
 async def wrapper(raw_msg):
     urls = []
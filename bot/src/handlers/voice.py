@@ -40,7 +40,7 @@ async def handle(chat, lang, update, context):
             # Enviar respuesta            
             text = f"🎤 {transcribed_text}"
             interaction_cache[chat.id] = ("visto", now())
-            await db.set_chat_attribute(chat, "last_interaction", now())
+            await db.set_last_interaction(chat, now())
         except Exception as e:
             logger.error(f'{__name__}: <transcribe_message_handle> {errorpredlang}: {e}')
             await tasks.releasemaphore(chat=chat)
@@ -11,17 +11,34 @@ from telegram.ext import (
     AIORateLimiter,
     filters
 )
-from .handlers import message, voice, ocr_image, document, timeout, error
+from .handlers import message, voice, ocr_image, document, timeout, error, menu
 from .handlers.commands import (
 start, help, retry, new, cancel, chat_mode, model,
 api, img, lang, status, reset, search, props, istyle, iratio, imodel)
 from .handlers.callbacks import imagine
-from .tasks import apis_chat, apis_image, cache, apis_check_idler
+from .tasks import apis_chat, apis_image, cache, apis_check_idler, journal, archive, bus, images
 from .utils import config
+from .utils.preprocess import prompts, tokenizer
 from .utils.proxies import bb, asyncio
 
 async def post_init(application: Application):
     bb(cache.task())
+    bb(images.task())
+    from .utils.proxies import db
+    await db.ensure_indexes()
+    await db.warm_known_chats()
+    logger.info(f"⌨️ {await menu.prebuild()}")
+    loaded, failed = await tokenizer.preload()
+    logger.info(f"🔤 {' '.join(loaded)}")
+    for error in failed:
+        logger.warning(f"🔤 {error}")
+    prompts.build()
+    if config.cache_bus != "local":
+        bb(bus.task())
+    if config.database_backend == "json":
+        bb(journal.task())
+    if config.dialog_archive_days > 0:
+        bb(archive.task())
     if config.disable_apis_checkers != True:
         bb(apis_check_idler.task())
         bb(apis_chat.task())
@@ -41,6 +58,12 @@ async def post_init(application: Application):
     await application.bot.set_my_commands(commandos)
     logger.info(f'-----{config.lang[config.pred_lang]["mensajes"]["bot_iniciado"]}-----')
 
+async def post_shutdown(application: Application):
+    from .utils.proxies import db
+    from .handlers.commands.img import document_groups
+    await db.close()
+    document_groups.close()
+
 def build_application():
     return (
         ApplicationBuilder()
@@ -58,6 +81,7 @@ def build_application():
         .get_updates_http_version("1.1")
         .rate_limiter(AIORateLimiter(max_retries=5))
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
 def get_user_filter():
@@ -9,6 +9,8 @@ vivas = config.api["available_api"]
 malas = []
 temp_malas = []
 temp_vivas = []
+# sube cada vez que cambia vivas; los teclados de menú guardados llevan esta versión
+version = 0
 
 async def checar_api(nombre_api):
     global temp_malas
@@ -58,6 +60,7 @@ async def task():
     global malas
     global temp_vivas
     global temp_malas
+    global version
     test=False
     while True:
         from bot.src.tasks.apis_check_idler import variable_minutes
@@ -78,6 +81,7 @@ async def task():
                 from bot.src.utils.misc import api_check_text_maker
                 outp = await api_check_text_maker(type="chat", vivas=vivas, temp_vivas=temp_vivas, temp_malas=temp_malas)
                 logger.info(outp)
+                version += 1
             else:
                 logger.info("CHAT_APIS ✅")
             vivas = list(temp_vivas)
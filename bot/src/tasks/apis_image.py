@@ -7,6 +7,8 @@ img_vivas = config.api["available_image_api"]
 img_malas = []
 img_temp_malas = []
 img_temp_vivas = []
+# sube cada vez que cambia img_vivas; los teclados de menú guardados llevan esta versión
+img_version = 0
 
 async def checar_api(nombre_api):
     global img_temp_malas
@@ -29,6 +31,7 @@ async def task():
     global img_malas
     global img_temp_vivas
     global img_temp_malas
+    global img_version
     test=False
     while True:
         from bot.src.tasks.apis_check_idler import variable_minutes
@@ -47,6 +50,7 @@ async def task():
                 from bot.src.utils.misc import api_check_text_maker
                 outp = await api_check_text_maker(type="img", vivas=img_vivas, temp_vivas=img_temp_vivas, temp_malas=img_temp_malas)
                 logger.info(outp)
+                img_version += 1
             else:
                 logger.info("IMAGE_APIS ✅")
             img_vivas = list(img_temp_vivas)
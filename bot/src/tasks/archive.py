@@ -0,0 +1,15 @@
+from datetime import timedelta
+from bot.src.utils.constants import logger
+
+async def task():
+    from bot.src.utils.proxies import db, config, sleep, asyncio
+    while True:
+        try:
+            archived = await db.archive_idle_dialogs(timedelta(days=config.dialog_archive_days))
+            if archived:
+                logger.info(f"📦 {archived}")
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f'{__name__}: {e}')
+        await sleep(60 * 60)
@@ -0,0 +1,14 @@
+from bot.src.utils.constants import logger
+
+async def task():
+    from bot.src.utils.proxies import db, sleep, asyncio
+    while True:
+        try:
+            async for chat_id, _ in db.bus.listen():
+                db.invalidate_settings(chat_id)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f'{__name__}: {e}')
+        # el stream se cortó: se vuelve a abrir
+        await sleep(5)
@@ -1,18 +1,12 @@
-from udatetime import now
+from bot.src.utils.constants import logger
 
-async def delete_expired_items(cache):
-    for key, value in list(cache.items()):
-        if now() > value[1]: 
-            del cache[key]
-async def handle_cache(cache):
-    if cache is not None and isinstance(cache, dict):
-        await delete_expired_items(cache)
 async def task():
-    from bot.src.utils.proxies import cache_index, lang_cache, chat_mode_cache, api_cache, model_cache, menu_cache, interaction_cache, image_api_cache, imaginepy_ratios_cache, imaginepy_styles_cache, imaginepy_models_cache, sleep, asyncio
+    from bot.src.utils.proxies import cache_index, sleep, asyncio
     while True:
         try:
-            for cache in cache_index:
-                await handle_cache(cache)
+            removed = sum(cache.sweep() for cache in cache_index)
+            if removed:
+                logger.info(f"🧹 {removed} | " + " ".join(f"{stats['name']}:{stats['hits']}/{stats['misses']}" for stats in (cache.stats() for cache in cache_index)))
         except asyncio.CancelledError:
             break
-        await sleep(60 * 60)
\ No newline at end of file
+        await sleep(10 * 60)
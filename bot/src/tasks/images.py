@@ -0,0 +1,13 @@
+from bot.src.utils.constants import logger
+
+async def task():
+    from bot.src.handlers.commands.img import document_groups
+    from bot.src.utils.proxies import sleep, asyncio
+    while True:
+        try:
+            if document_groups.sweep():
+                stats = document_groups.stats()
+                logger.info(f"🖼 {stats['size']} | {stats['hits']}/{stats['misses']} | 💾 {stats['ram'] // 1024}KB | 📁 {stats['spilled']}")
+        except asyncio.CancelledError:
+            break
+        await sleep(60)
@@ -0,0 +1,11 @@
+from bot.src.utils.constants import logger
+
+async def task():
+    from bot.src.utils.proxies import db, config, sleep, asyncio
+    while True:
+        try:
+            if await db.compact_json(config.json_journal_compact_mb * (1024 * 1024)):
+                logger.info("🗜️ JSON DB")
+        except asyncio.CancelledError:
+            break
+        await sleep(config.json_journal_compact_minutes * 60)
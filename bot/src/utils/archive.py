@@ -0,0 +1,48 @@
+import gzip
+from ujson import dumps, loads
+from pathlib import Path
+from os import replace
+
+class Archive:
+    # /database/archive/<chat_id>.jsonl.gz, un diálogo por línea con su "_id"
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def path(self, chat_id: str) -> Path:
+        return self.directory / f"{chat_id}.jsonl.gz"
+
+    def append(self, chat_id: str, dialogs: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lines = "".join(dumps({"_id": dialog_id, **dialog_dict}, ensure_ascii=False) + "\n" for dialog_id, dialog_dict in dialogs.items())
+        # cada append es un miembro gzip nuevo; gzip los lee como un solo flujo
+        with gzip.open(self.path(chat_id), "at", encoding="utf-8") as file:
+            file.write(lines)
+
+    def read(self, chat_id: str) -> dict:
+        path = self.path(chat_id)
+        if not path.exists():
+            return {}
+        dialogs = {}
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                dialog_dict = loads(line)
+                dialogs[dialog_dict.pop("_id")] = dialog_dict
+        return dialogs
+
+    def get(self, chat_id: str, dialog_id: str):
+        return self.read(chat_id).get(dialog_id)
+
+    def remove(self, chat_id: str, dialog_id: str):
+        dialogs = self.read(chat_id)
+        if dialogs.pop(dialog_id, None) is None:
+            return
+        if dialogs:
+            tmp_path = self.path(chat_id).with_suffix(".tmp")
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+                file.write("".join(dumps({"_id": key, **value}, ensure_ascii=False) + "\n" for key, value in dialogs.items()))
+            replace(tmp_path, self.path(chat_id))
+        else:
+            self.discard(chat_id)
+
+    def discard(self, chat_id: str):
+        self.path(chat_id).unlink(missing_ok=True)
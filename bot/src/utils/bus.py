@@ -0,0 +1,61 @@
+import asyncio
+from uuid import uuid4
+from udatetime import now
+from . import config
+
+class LocalBus:
+    # mismo proceso: sirve para un solo worker y para probar varios Database juntos
+    channels = []
+
+    def __init__(self):
+        self.worker = str(uuid4())
+        self.queue = asyncio.Queue()
+        LocalBus.channels.append(self)
+
+    async def ensure_indexes(self):
+        pass
+
+    async def publish(self, chat_id, keys: list):
+        for channel in LocalBus.channels:
+            if channel is not self:
+                channel.queue.put_nowait((chat_id, keys))
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def close(self):
+        if self in LocalBus.channels:
+            LocalBus.channels.remove(self)
+
+class MongoBus:
+    # change streams: mongo tiene que ser un replica set (vale uno de un solo nodo)
+    def __init__(self, db):
+        self.worker = str(uuid4())
+        self.invalidations = db["invalidations"]
+
+    async def ensure_indexes(self):
+        # cada aviso solo hace falta mientras los workers lo leen
+        await self.invalidations.create_index("date", expireAfterSeconds=60 * 60)
+
+    async def publish(self, chat_id, keys: list):
+        await self.invalidations.insert_one({"worker": self.worker, "chat_id": chat_id, "keys": keys, "date": now()})
+
+    async def listen(self):
+        pipeline = [{"$match": {"operationType": "insert", "fullDocument.worker": {"$ne": self.worker}}}]
+        async with self.invalidations.watch(pipeline) as stream:
+            async for change in stream:
+                document = change["fullDocument"]
+                yield document["chat_id"], document["keys"]
+
+    async def close(self):
+        pass
+
+def create_bus(transport: str, backend):
+    if transport == "local":
+        return LocalBus()
+    if transport == "mongo":
+        if config.database_backend != "mongo":
+            raise ValueError("CACHE_BUS mongo necesita DATABASE_BACKEND mongo")
+        return MongoBus(backend.db)
+    raise ValueError(f"CACHE_BUS {transport} no existe")
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from time import monotonic
+
+class Cache:
+    # dict con tamaño máximo (LRU) y expiración por entrada; se usa igual que los dicts de proxies
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expira, valor)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        if item[0] <= monotonic():
+            del self.entries[key]
+            self.evictions += 1
+            return None
+        self.entries.move_to_end(key)
+        return item
+
+    def get(self, key, default=None):
+        # una sola consulta: usar esto y no `key in cache` seguido de cache[key]
+        item = self.lookup(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return item[1]
+
+    def __contains__(self, key):
+        item = self.lookup(key)
+        if item is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def __getitem__(self, key):
+        # sin contar; puede lanzar KeyError si la entrada caduca después de un `in`, mejor get()
+        item = self.lookup(key)
+        if item is None:
+            raise KeyError(key)
+        return item[1]
+
+    def __setitem__(self, key, value):
+        self.entries[key] = (monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __delitem__(self, key):
+        del self.entries[key]
+
+    def pop(self, key, default=None):
+        item = self.entries.pop(key, None)
+        return default if item is None else item[1]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def sweep(self) -> int:
+        expired = [key for key, (expires, _) in self.entries.items() if expires <= monotonic()]
+        for key in expired:
+            del self.entries[key]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        return {"name": self.name, "size": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -13,15 +13,35 @@ columnpage = int(env.get('MAX_COLUMNS_PER_PAGE', [2])[0])
 user_whitelist = env.get('USER_WHITELIST', [])
 chat_whitelist = env.get('CHAT_WHITELIST', [])
 json_database = bool(env.get('WITHOUT_MONGODB', ['False'])[0].lower() == 'true')
+database_backend = str(env.get('DATABASE_BACKEND', ['json' if json_database else 'mongo'])[0]).lower()
+json_journal = bool(env.get('JSON_DATABASE_JOURNAL', ['True'])[0].lower() == 'true')
+json_journal_compact_mb = int(env.get('JSON_JOURNAL_COMPACT_MB', [8])[0])
+json_journal_compact_minutes = int(env.get('JSON_JOURNAL_COMPACT_MINUTES', [10])[0])
+json_flush_seconds = float(env.get('JSON_DATABASE_FLUSH_SECONDS', [1])[0])
+json_layout = str(env.get('JSON_DATABASE_LAYOUT', ['single'])[0]).lower()
+json_shard_cache = int(env.get('JSON_SHARD_CACHE', [500])[0])
+cache_max_size = int(env.get('CACHE_MAX_SIZE', [10000])[0])
+cache_ttl_minutes = int(env.get('CACHE_TTL_MINUTES', [60])[0])
+cache_bus = str(env.get('CACHE_BUS', ['local'])[0]).lower()
+function_cache_size = int(env.get('FUNCTION_CACHE_SIZE', [500])[0])
+known_chats_cache = int(env.get('KNOWN_CHATS_CACHE', [10000])[0])
+interaction_flush_seconds = float(env.get('INTERACTION_FLUSH_SECONDS', [5])[0])
 dialog_timeout = int(env.get('DIALOG_TIMEOUT', [7200])[0])
+user_names_per_chat = int(env.get('USER_NAMES_PER_CHAT', [200])[0])
+dialog_max_messages = int(env.get('DIALOG_MAX_MESSAGES', [200])[0])
+dialog_archive_days = int(env.get('DIALOG_ARCHIVE_DAYS', [30])[0])
 n_images = int(env.get('OUTPUT_IMAGES', [4])[0])
-if json_database != True:
+if database_backend == "mongo":
     mongus = env.get("MONGODB_HOST", ['mongo'])[0]
     if "mongodb.net" in mongus:
         MONGODB_PROTO = "mongodb+srv"
     else:
         MONGODB_PROTO = "mongodb"
     mongodb_uri = f"{MONGODB_PROTO}://{env.get('MONGODB_USERNAME', ['root'])[0]}:{env.get('MONGODB_PASSWORD', ['MMWjHEHT8zd3FMR5KPd7eu6MKV2ndpUd'])[0]}@{mongus}/?retryWrites=true&w=majority"
+    mongodb_pool_size = int(env.get('MONGODB_POOL_SIZE', [100])[0])
+    mongodb_min_pool_size = int(env.get('MONGODB_MIN_POOL_SIZE', [0])[0])
+    mongodb_timeout_ms = int(env.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', [30000])[0])
+    mongodb_compressors = str(env.get('MONGODB_COMPRESSORS', [''])[0]).lower()
 
 disable_apis_checkers = bool(env.get('DISABLE_APIS_CHECK', ['False'])[0].lower() == 'true')
 apischeck_minutes = int(env.get('APIS_CHECK_MINUTES', [10])[0])
@@ -37,8 +57,15 @@ switch_search = bool(env.get('FEATURE_BROWSING', ['True'])[0].lower() == 'true')
 switch_urls = bool(env.get('FEATURE_URL_READ', ['True'])[0].lower() == 'true')
 audio_max_size = int(env.get('AUDIO_MAX_MB', [20])[0])
 generatedimagexpiration = int(env.get('GENERATED_IMAGE_EXPIRATION_MINUTES', ['5'])[0])
+generated_image_groups = int(env.get('GENERATED_IMAGE_MAX_GROUPS', [1000])[0])
+generated_image_ram = int(env.get('GENERATED_IMAGE_MAX_RAM_MB', [0])[0])
 file_max_size = int(env.get('DOC_MAX_MB', [10])[0])
+file_cache_size = int(env.get('FILE_CACHE_SIZE', [200])[0])
+file_cache_disk_mb = int(env.get('FILE_CACHE_DISK_MB', [100])[0])
 url_max_size = int(env.get('URL_MAX_MB', [5])[0])
+url_cache_minutes = int(env.get('URL_CACHE_MINUTES', [60])[0])
+url_cache_size = int(env.get('URL_CACHE_SIZE', [100])[0])
+url_cache_disk_mb = int(env.get('URL_CACHE_DISK_MB', [100])[0])
 
 max_retries = int(env.get('REQUEST_MAX_RETRIES', [3])[0])
 
@@ -1,161 +1,182 @@
-from ujson import load, dump
+import asyncio
 from typing import Optional, Any
 from uuid import uuid4
+from datetime import timedelta
+from collections import OrderedDict
 from . import config
-from udatetime import now, now_to_string, to_string
-from pymongo.errors import DuplicateKeyError
-from motor.motor_asyncio import AsyncIOMotorClient
-from .constants import (constant_db_model, constant_db_chat_mode, constant_db_api,
+from udatetime import now
+from .constants import (logger, constant_db_model, constant_db_chat_mode, constant_db_api,
                         constant_db_lang, constant_db_tokens, constant_db_image_api,
                         image_api_styles, constant_db_image_api_styles)
-from pathlib import Path
-
-def is_datetime(obj):
-    required_attrs = ["year", "month", "day", "hour", "minute", "second", "microsecond"]
-    return all(hasattr(obj, attr) for attr in required_attrs)
+from .storage import create_storage
+from .bus import create_bus
+from .settings import ChatSettings, FIELDS, CACHED_KEYS
+from .cache import Cache
 
 class Database:
     def __init__(self):
-        self.use_json = config.json_database
-        self.client = None
-        self.db = None
-        self.chats = None
-        self.dialogs = None
-        self.data = None
-
-        if self.use_json:
-            self.data_files = {
-                "chats": Path("/database/chats.json"),
-                "dialogs": Path("/database/dialogs.json")
-            }
-            self.load_data_from_json()
-        else:
-            self.client = AsyncIOMotorClient(config.mongodb_uri)
-            self.db = self.client["chatgpt"]
-            self.chats = self.db["chats"]
-            self.dialogs = self.db["dialogs"]
-
-    def load_data_from_json(self):
-        self.data = {}
-        for key, file_path in self.data_files.items():
-            if file_path.exists():
-                with file_path.open(encoding="utf-8") as file:
-                    self.data[key] = load(file)
-            else:
-                self.data[key] = {}
-                self.save_data_to_json(key)  # Guardar datos en el archivo JSON vacío
-
-    def save_data_to_json(self, key: str):
-        data = self.convert_datetime(self.data[key])
-        with self.data_files[key].open("w", encoding="utf-8") as file:
-            dump(data, file, indent=2, ensure_ascii=False)
-    
-    def convert_datetime(self, data):
-        if isinstance(data, dict):
-            return {key: self.convert_datetime(value) for key, value in data.items()}
-        elif isinstance(data, list):
-            return [self.convert_datetime(item) for item in data]
-        elif is_datetime(data):
-            return to_string(data)
-        else:
-            return data
-
-    
+        # mongo, json o sqlite; ver utils/storage
+        self.backend = create_storage(config.database_backend)
+        self.known_chats = OrderedDict()
+        # ChatSettings por chat; cada escritura de Database lo mantiene al día
+        self.settings = Cache("settings", config.cache_max_size, config.cache_ttl_minutes * 60)
+        # avisa a los demás workers de los ajustes que cambian aquí
+        self.bus = create_bus(config.cache_bus, self.backend)
+        # último last_interaction de cada chat pendiente de guardar
+        self.interactions = {}
+        self.interactions_task = None
+
+    async def ensure_indexes(self):
+        await self.backend.ensure_indexes()
+        await self.bus.ensure_indexes()
+
+    async def compact_json(self, min_size: int = 0) -> bool:
+        return await self.backend.compact(min_size)
+
+    async def close(self):
+        if self.interactions_task is not None:
+            self.interactions_task.cancel()
+            self.interactions_task = None
+        await self.flush_interactions()
+        await self.bus.close()
+        await self.backend.close()
+
+    async def archive_idle_dialogs(self, max_age: timedelta) -> int:
+        await self.flush_interactions()
+        return await self.backend.archive_idle_dialogs(now() - max_age)
+
+    async def set_last_interaction(self, chat, value=None):
+        # se escribe en bloque cada INTERACTION_FLUSH_SECONDS
+        self.interactions[str(chat.id)] = value or now()
+        self.update_settings(chat, {"last_interaction": self.interactions[str(chat.id)]})
+        self.schedule_interactions_flush()
+
+    def schedule_interactions_flush(self):
+        if self.interactions_task is None:
+            self.interactions_task = asyncio.create_task(self.delayed_interactions_flush())
+
+    async def delayed_interactions_flush(self):
+        try:
+            await asyncio.sleep(config.interaction_flush_seconds)
+        finally:
+            self.interactions_task = None
+        try:
+            await self.flush_interactions()
+        except Exception as e:
+            # nadie espera esta tarea: se registra y se reintenta en el siguiente intervalo
+            logger.error(f'<delayed_interactions_flush> {e}')
+            self.schedule_interactions_flush()
+
+    async def flush_interactions(self):
+        if not self.interactions:
+            return
+        interactions, self.interactions = self.interactions, {}
+        try:
+            await self.backend.update_chats({chat_id: {"last_interaction": value} for chat_id, value in interactions.items()})
+        except BaseException:
+            # también si se cancela la tarea: vuelven al buffer sin pisar los que llegaron durante la escritura
+            for chat_id, value in interactions.items():
+                self.interactions.setdefault(chat_id, value)
+            raise
+
+    def with_interaction(self, chat, chat_dict: dict) -> dict:
+        # el valor en memoria es más nuevo que el guardado
+        if chat_dict is None or str(chat.id) not in self.interactions:
+            return chat_dict
+        return {**chat_dict, "last_interaction": self.interactions[str(chat.id)]}
+
+    async def load_settings(self, chat) -> ChatSettings:
+        settings = self.settings.get(chat.id)
+        if settings is None:
+            settings = ChatSettings(await self.get_chat_attributes_dict(chat, list(FIELDS.values())))
+            self.settings[chat.id] = settings
+        return settings
+
+    def update_settings(self, chat, values: dict):
+        settings = self.settings.get(chat.id)
+        if settings is not None:
+            settings.update(values)
+
+    async def publish(self, chat, keys: list):
+        keys = [key for key in keys if key in CACHED_KEYS]
+        if keys:
+            await self.bus.publish(chat.id, keys)
+
+    def invalidate_settings(self, chat_id):
+        # aviso de otro worker: se vuelve a leer de la base de datos
+        self.settings.pop(chat_id)
+
+    def remember_chat(self, chat_id: str):
+        self.known_chats[chat_id] = None
+        self.known_chats.move_to_end(chat_id)
+        while len(self.known_chats) > config.known_chats_cache:
+            self.known_chats.popitem(last=False)
+
+    def missing_chat(self, chat):
+        self.known_chats.pop(str(chat.id), None)
+        self.settings.pop(chat.id)
+        raise ValueError(f"Chat {str(chat.id)} no existe")
+
+    async def warm_known_chats(self):
+        if config.known_chats_cache <= 0:
+            return
+        chat_ids = await self.backend.recent_chat_ids(config.known_chats_cache)
+        # los más recientes quedan al final del LRU
+        for chat_id in reversed(chat_ids):
+            self.remember_chat(chat_id)
+
     async def chat_exists(self, chat, raise_exception: bool = False):
-        if self.use_json:
-            if self.data["chats"].get(str(chat.id)):
-                return True
-        else:
-            if await self.chats.count_documents({"_id": str(chat.id)}) > 0:
-                return True
-    
+        if str(chat.id) in self.known_chats:
+            self.known_chats.move_to_end(str(chat.id))
+            return True
+        if await self.backend.chat_exists(str(chat.id)):
+            self.remember_chat(str(chat.id))
+            return True
+
         if raise_exception:
             raise ValueError(f"Chat {str(chat.id)} no existe")
         return False
-            
+
 
     async def add_chat(self, chat, lang: str):
         from bot.src.tasks.apis_chat import vivas as apis_vivas
         from bot.src.tasks.apis_image import img_vivas
         if not await self.chat_exists(chat):
-            if self.use_json:
-                self.data["chats"][str(chat.id)] = {
-                    "last_interaction": now_to_string(),
-                    "current_dialog_id": None,
-                    constant_db_lang: lang,
-                    constant_db_chat_mode: config.chat_mode["available_chat_mode"][1],
-                    constant_db_model: config.api["info"][apis_vivas[0]]["available_model"][0],
-                    constant_db_api: apis_vivas[0],
-                    constant_db_image_api: img_vivas[0],
-                    constant_db_image_api_styles: image_api_styles[0],
-                    #constant_db_imaginepy_styles: imaginepy_styles[0],
-                    #constant_db_imaginepy_ratios: imaginepy_ratios[0],
-                    #constant_db_imaginepy_models: imaginepy_models[0],
-                }
-                self.save_data_to_json("chats")
-            else:
-                chat_dict = {
-                    "_id": str(chat.id),
-                    "last_interaction": now(),
-                    "current_dialog_id": None,
-                    constant_db_lang: lang,
-                    constant_db_chat_mode: config.chat_mode["available_chat_mode"][1],
-                    constant_db_model: config.api["info"][apis_vivas[0]]["available_model"][0],
-                    constant_db_api: apis_vivas[0],
-                    constant_db_image_api: img_vivas[0],
-                    constant_db_image_api_styles: image_api_styles[0],
-                    #constant_db_imaginepy_styles: imaginepy_styles[0],
-                    #constant_db_imaginepy_ratios: imaginepy_ratios[0],
-                    #constant_db_imaginepy_models: imaginepy_models[0],
-                }
-                try:
-                    await self.chats.insert_one(chat_dict)
-                except DuplicateKeyError:
-                    pass
+            chat_dict = {
+                "last_interaction": now(),
+                "current_dialog_id": None,
+                constant_db_lang: lang,
+                constant_db_chat_mode: config.chat_mode["available_chat_mode"][1],
+                constant_db_model: config.api["info"][apis_vivas[0]]["available_model"][0],
+                constant_db_api: apis_vivas[0],
+                constant_db_image_api: img_vivas[0],
+                constant_db_image_api_styles: image_api_styles[0],
+                #constant_db_imaginepy_styles: imaginepy_styles[0],
+                #constant_db_imaginepy_ratios: imaginepy_ratios[0],
+                #constant_db_imaginepy_models: imaginepy_models[0],
+            }
+            await self.backend.insert_chat(str(chat.id), chat_dict)
+            self.remember_chat(str(chat.id))
 
     async def new_dialog(self, chat):
-        await self.chat_exists(chat, raise_exception=True)
         dialog_id = str(uuid4())
-        if self.use_json:
-            self.data["dialogs"][dialog_id] = {
-                "chat_id": str(chat.id),
-                constant_db_tokens: 0,
-                "messages": [],
-            }
-            self.data["chats"][str(chat.id)]["current_dialog_id"] = dialog_id
-            self.save_data_to_json("dialogs")
-            self.save_data_to_json("chats")
-        else:
-            dialog_dict = {
-                "_id": dialog_id,
-                "chat_id": str(chat.id),
-                constant_db_tokens: 0,
-                "messages": [],
-            }
-            # add new dialog
-            await self.dialogs.insert_one(dialog_dict)
-
-            # update chat's current dialog
-            await self.chats.update_one(
-                {"_id": str(chat.id)},
-                {"$set": {"current_dialog_id": dialog_id}}
-            )
-
+        if not await self.backend.insert_dialog(str(chat.id), dialog_id):
+            self.missing_chat(chat)
+        self.update_settings(chat, {"current_dialog_id": dialog_id})
+        await self.publish(chat, ["current_dialog_id"])
         return dialog_id
 
     async def get_chat_attribute(self, chat, key: str):
-        await self.chat_exists(chat, raise_exception=True)
-        if self.use_json:
-            chat_dict = self.data["chats"][str(chat.id)]
-        else:
-            chat_dict = await self.chats.find_one({"_id": str(chat.id)})
-            
+        if key == "last_interaction" and str(chat.id) in self.interactions:
+            return self.interactions[str(chat.id)]
+        chat_dict = await self.backend.get_chat(str(chat.id), [key])
+        if chat_dict is None:
+            self.missing_chat(chat)
         return chat_dict.get(key, None)
-        
+
     async def reset_chat_attribute(self, chat):
         from bot.src.tasks.apis_chat import vivas as apis_vivas
         from bot.src.tasks.apis_image import img_vivas
-        await self.chat_exists(chat, raise_exception=True)
         initial_chat_mode = config.chat_mode["available_chat_mode"][0]
         initial_api = apis_vivas[0]
         initial_model = config.api["info"][initial_api]["available_model"][0]
@@ -164,110 +185,92 @@ class Database:
         #initial_imaginepy_style = imaginepy_styles[0]
         #initial_imaginepy_ratio = imaginepy_ratios[0]
         #initial_imaginepy_model = imaginepy_models[0]
-        if self.use_json: 
-            self.data["chats"][str(chat.id)][constant_db_chat_mode] = initial_chat_mode
-            self.data["chats"][str(chat.id)][constant_db_model] = initial_model
-            self.data["chats"][str(chat.id)][constant_db_api] = initial_api
-            self.data["chats"][str(chat.id)][constant_db_image_api] = initial_image
-            self.data["chats"][str(chat.id)][constant_db_image_api_styles] = initial_image_style
-            #self.data["chats"][str(chat.id)][constant_db_imaginepy_styles] = initial_imaginepy_style
-            #self.data["chats"][str(chat.id)][constant_db_imaginepy_ratios] = initial_imaginepy_ratio
-            #self.data["chats"][str(chat.id)][constant_db_imaginepy_models] = initial_imaginepy_model
-            self.save_data_to_json("chats")  # Guardar datos en el archivo JSON
-        else:
-            # Actualizar los valores en la base de datos
-            await self.set_chat_attribute(chat, constant_db_chat_mode, initial_chat_mode)
-            await self.set_chat_attribute(chat, constant_db_model, initial_model)
-            await self.set_chat_attribute(chat, constant_db_api, initial_api)
-            await self.set_chat_attribute(chat, constant_db_image_api, initial_image)
-            await self.set_chat_attribute(chat, constant_db_image_api_styles, initial_image_style)
-            #await self.set_chat_attribute(chat, constant_db_imaginepy_styles, initial_imaginepy_style)
-            #await self.set_chat_attribute(chat, constant_db_imaginepy_ratios, initial_imaginepy_ratio)
-            #await self.set_chat_attribute(chat, constant_db_imaginepy_models, initial_imaginepy_model)
-            
+        initial = {
+            constant_db_chat_mode: initial_chat_mode,
+            constant_db_model: initial_model,
+            constant_db_api: initial_api,
+            constant_db_image_api: initial_image,
+            constant_db_image_api_styles: initial_image_style,
+            #constant_db_imaginepy_styles: initial_imaginepy_style,
+            #constant_db_imaginepy_ratios: initial_imaginepy_ratio,
+            #constant_db_imaginepy_models: initial_imaginepy_model,
+        }
+        # Actualizar los valores en la base de datos en una sola escritura
+        if not await self.backend.update_chat(str(chat.id), initial):
+            self.missing_chat(chat)
+        self.update_settings(chat, initial)
+        await self.publish(chat, list(initial))
+
     async def set_chat_attribute(self, chat, key: str, value: Any):
-        await self.chat_exists(chat, raise_exception=True)
-        if self.use_json:
-            self.data["chats"][str(chat.id)][key] = value
-            self.save_data_to_json("chats")
-        else:
-            await self.chats.update_one({"_id": str(chat.id)}, {"$set": {key: value}})
+        if key == "last_interaction":
+            await self.set_last_interaction(chat, value)
+            return
+        if not await self.backend.update_chat(str(chat.id), {key: value}):
+            self.missing_chat(chat)
+        self.update_settings(chat, {key: value})
+        await self.publish(chat, [key])
+
+    async def set_chat_entry(self, chat, key: str, entry: str, value: Any):
+        # una sola entrada de un atributo dict (p. ej. un alias de user_names), sin reescribir las demás
+        if not await self.backend.update_chat(str(chat.id), {f"{key}.{entry}": value}):
+            self.missing_chat(chat)
 
     async def set_dialog_attribute(self, chat, key: str, value: Any):
         dialog_id = await self.get_chat_attribute(chat, "current_dialog_id")
-        if self.use_json:
-            if dialog_id and dialog_id in self.data["dialogs"]:
-                self.data["dialogs"][dialog_id][key] = value
-                self.save_data_to_json("dialogs")
-        else:
-            await self.dialogs.update_one(
-                {"_id": dialog_id},
-                {"$set": {key: value}}
-            )
+        await self.backend.update_dialog(str(chat.id), dialog_id, {key: value})
 
     async def get_dialog_attribute(self, chat, key: str):
         dialog_id = await self.get_chat_attribute(chat, "current_dialog_id")
-        if self.use_json:
-            if dialog_id and dialog_id in self.data["dialogs"]:
-                dialog_dict = self.data["dialogs"][dialog_id]
-        else:
-            dialog_dict = await self.dialogs.find_one({"_id": dialog_id})
-
+        dialog_dict = await self.backend.get_dialog(str(chat.id), dialog_id, with_messages=key == "messages") or {}
         return dialog_dict.get(key, None)
 
     async def get_dialog_messages(self, chat, dialog_id: Optional[str] = None):
-        await self.chat_exists(chat, raise_exception=True)
         if dialog_id is None:
             dialog_id = await self.get_chat_attribute(chat, "current_dialog_id")
-        if self.use_json:
-            if dialog_id and dialog_id in self.data["dialogs"]:
-                return self.data["dialogs"][dialog_id]["messages"]
-            return []
-        else:
-            dialog_dict = await self.dialogs.find_one({"_id": dialog_id, "chat_id": str(chat.id)})
-            return dialog_dict["messages"]
+        dialog_dict = await self.backend.get_dialog(str(chat.id), dialog_id)
+        return dialog_dict["messages"] if dialog_dict else []
 
     async def set_dialog_messages(self, chat, dialog_messages: list, dialog_id: Optional[str] = None):
-        await self.chat_exists(chat, raise_exception=True)
         if dialog_id is None:
             dialog_id = await self.get_chat_attribute(chat, "current_dialog_id")
-        if self.use_json:
-            if dialog_id:
-                if dialog_id in self.data["dialogs"]:
-                    self.data["dialogs"][dialog_id]["messages"] = dialog_messages
-                    self.save_data_to_json("dialogs")
-        else:
-            await self.dialogs.update_one(
-                {"_id": dialog_id, "chat_id": str(chat.id)},
-                {"$set": {"messages": dialog_messages}}
-            )
+        await self.backend.update_dialog(str(chat.id), dialog_id, {"messages": dialog_messages})
 
     async def delete_all_dialogs_except_current(self, chat):
-        if self.use_json:
-            if str(chat.id) in self.data["chats"]:
-                current_dialog_id = self.data["chats"][str(chat.id)].get("current_dialog_id")
-                chat_id = str(chat.id)
-                self.data["dialogs"] = {
-                    dialog_id: dialog_data
-                    for dialog_id, dialog_data in self.data["dialogs"].items()
-                    if not (dialog_data["chat_id"] == chat_id and dialog_id != current_dialog_id)
-                }
-                self.save_data_to_json("dialogs")
-        else:
-            chat = await self.chats.find_one({"_id": str(chat.id)})
-            if not chat:
-                raise ValueError(f"Chat with ID {str(chat.id)} does not exist")
-            current_dialog_id = chat["current_dialog_id"]
-            await self.dialogs.delete_many({"chat_id": chat["_id"], "_id": {"$ne": current_dialog_id}})
-            
+        current_dialog_id = await self.get_chat_attribute(chat, "current_dialog_id")
+        await self.backend.delete_dialogs_except(str(chat.id), current_dialog_id)
+
     async def get_chat_attributes_dict(self, chat, keys: list):
-        await self.chat_exists(chat, raise_exception=True)
-    
-        if self.use_json:
-            chat_dict = {key: self.data["chats"][str(chat.id)].get(key, None) for key in keys}
-        else:
-            projection = {key: 1 for key in keys}
-            chat_dict = await self.chats.find_one({"_id": str(chat.id)}, projection=projection)
-    
+        chat_dict = await self.backend.get_chat(str(chat.id), keys)
+        if chat_dict is None:
+            self.missing_chat(chat)
+        if "last_interaction" in keys:
+            return self.with_interaction(chat, chat_dict)
         return chat_dict
-                
\ No newline at end of file
+
+    async def load_turn_context(self, chat, with_messages: bool = True, settings: Optional[ChatSettings] = None):
+        # ajustes + diálogo actual; si los ajustes no están en caché salen junto con el diálogo en una sola consulta
+        settings = settings or self.settings.get(chat.id)
+        if settings is not None:
+            return settings, await self.backend.get_dialog(str(chat.id), settings.current_dialog_id, with_messages)
+        context = await self.backend.load_turn_context(str(chat.id), with_messages)
+        if context is None:
+            self.missing_chat(chat)
+        chat_dict, dialog = context
+        settings = ChatSettings(self.with_interaction(chat, chat_dict))
+        self.settings[chat.id] = settings
+        return settings, dialog
+
+    async def commit_turn(self, chat, dialog_id: Optional[str], dialog_messages: list, tokens: int, last_interaction=None):
+        if last_interaction is not None:
+            await self.set_last_interaction(chat, last_interaction)
+        await self.backend.update_dialog(str(chat.id), dialog_id, {"messages": dialog_messages, constant_db_tokens: tokens})
+
+    async def push_dialog_message(self, chat, dialog_id: Optional[str], dialog_message: dict, tokens: int, last_interaction=None):
+        # agrega solo el mensaje nuevo y devuelve el total de tokens del diálogo
+        if last_interaction is not None:
+            await self.set_last_interaction(chat, last_interaction)
+        return await self.backend.push_dialog_message(str(chat.id), dialog_id, dialog_message, tokens)
+
+    async def trim_dialog_messages(self, chat, dialog_id: Optional[str], count: int, tokens: int):
+        # elimina los primeros `count` mensajes sin reenviar el resto del diálogo
+        await self.backend.trim_dialog_messages(str(chat.id), dialog_id, count, tokens)
@@ -0,0 +1,80 @@
+import asyncio
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from os import replace
+from pathlib import Path
+from ujson import dumps, loads
+from .cache import Cache
+
+def file_size(path: Path) -> int:
+    # otro proceso (o un borrado a mano) puede quitar el archivo en cualquier momento
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+class DiskCache:
+    # dicts por clave: en memoria (LRU) y en <directory>/<sha256>.json.gz hasta max_bytes; los más viejos se borran
+    def __init__(self, name: str, directory: Path, max_size: int, max_bytes: int, memory_ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory = Cache(name, max_size, memory_ttl)
+        self.disk_size = None
+        # un solo hilo: disk_size, los .tmp y shrink no se pisan entre escrituras
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}cache")
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{sha256(key.encode()).hexdigest()}.json.gz"
+
+    async def get(self, key: str):
+        entry = self.memory.get(key)
+        if entry is None and self.max_bytes:
+            entry = await asyncio.get_running_loop().run_in_executor(self.executor, self.load, key)
+            if entry is not None:
+                self.memory[key] = entry
+        return entry
+
+    async def put(self, key: str, entry: dict):
+        self.memory[key] = entry
+        if self.max_bytes:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.store, key, entry)
+
+    def load(self, key: str):
+        try:
+            with gzip.open(self.path(key), "rt", encoding="utf-8") as file:
+                return loads(file.read())
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+    def store(self, key: str, entry: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        previous = file_size(path)
+        tmp_path = path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            file.write(dumps(entry, ensure_ascii=False))
+        replace(tmp_path, path)
+        if self.disk_size is None:
+            self.disk_size = sum(file_size(file) for file in self.directory.glob("*.json.gz"))
+        else:
+            self.disk_size += file_size(path) - previous
+        if self.disk_size > self.max_bytes:
+            self.shrink()
+
+    def shrink(self):
+        # borra los más viejos hasta quedar en el 90% del límite
+        files = []
+        for file in self.directory.glob("*.json.gz"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        files.sort(key=lambda item: item[0])
+        self.disk_size = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if self.disk_size <= self.max_bytes * 0.9:
+                break
+            self.disk_size -= size
+            file.unlink(missing_ok=True)
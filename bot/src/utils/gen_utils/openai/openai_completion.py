@@ -79,8 +79,8 @@ async def procesar_nuevos_datos(self, function_name, arguments, kwargs):
     new_dialog_message = {'function': f'{function_name}', "func_cont": f'{function_response}', "date": now()}
     from bot.src.utils.misc import update_dialog_messages
     from bot.src.utils.preprocess import count_tokens, make_messages
-    await update_dialog_messages(self.chat, new_dialog_message)
-    data, completion_tokens, chat_mode = await count_tokens.putos_tokens(self.chat, kwargs["_message"])
+    await update_dialog_messages(self.chat, new_dialog_message, settings=self.settings)
+    data, completion_tokens, chat_mode = await count_tokens.putos_tokens(self.chat, kwargs["_message"], self.settings)
 
     self.diccionario["max_tokens"] = completion_tokens
 
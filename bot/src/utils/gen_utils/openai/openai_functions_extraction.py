@@ -1,10 +1,14 @@
 import os
 import importlib
+import asyncio
 
 from docstring_parser import parse
 import inspect
 import functools
 from typing import Callable
+from bot.src.utils import config
+from bot.src.utils.cache import Cache
+from bot.src.utils.constants import ERRFUNC, FUNCNOARG
 
 openai_functions = []
 
@@ -89,10 +93,58 @@ def extract_function_info(func: Callable) -> dict:
 
     return spec
 
-def openaifunc(func: Callable) -> Callable:
+def normalize_argument(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+def cache_key(signature, vary, args, kwargs):
+    # argumentos con sus valores por defecto y normalizados + los atributos de self que cambian el resultado
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    instance = arguments.pop("self", None)
+    return (tuple((name, normalize_argument(value)) for name, value in arguments.items()) +
+            tuple((name, getattr(instance, name, None)) for name in vary))
+
+def cached(func: Callable, ttl: float, vary: tuple) -> Callable:
+    cache = Cache(func.__name__, config.function_cache_size, ttl)
+    in_flight = {}
+    signature = inspect.signature(func)
+
+    async def call(key, args, kwargs):
+        result = await func(*args, **kwargs)
+        if result not in (None, ERRFUNC, FUNCNOARG):
+            cache[key] = result
+        return result
+
     @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        return func(*args, **kwargs)
+    async def wrapper(*args, **kwargs):
+        key = cache_key(signature, vary, args, kwargs)
+        result = cache.get(key)
+        if result is not None:
+            return result
+        # llamadas iguales al mismo tiempo esperan a la primera
+        task = in_flight.get(key)
+        if task is None:
+            task = in_flight[key] = asyncio.ensure_future(call(key, args, kwargs))
+            task.add_done_callback(lambda _: in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    wrapper.cache = cache
+    return wrapper
+
+def openaifunc(func: Callable = None, *, ttl: float = 0, vary: tuple = ()) -> Callable:
+    # @openaifunc o @openaifunc(ttl=segundos, vary=("lang",)): con ttl se guarda el resultado
+    if func is None:
+        return functools.partial(openaifunc, ttl=ttl, vary=vary)
+
+    if ttl and config.function_cache_size:
+        wrapper = cached(func, ttl, vary)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
 
     spec = extract_function_info(func)
     wrapper._openai_metadata = spec
@@ -1,7 +1,7 @@
 from bot.src.utils import proxies
 from asyncio import create_task
 from . import make_transcription, make_image
-from bot.src.utils.constants import constant_db_api, logger
+from bot.src.utils.constants import logger
 from bot.src.utils.gen_utils.make_completion import _make_api_call
 
 class ChatGPT:
@@ -20,9 +20,10 @@ class ChatGPT:
         create_task(middleware.resetip(self))
 
     @classmethod
-    async def create(cls, chat, lang="es", model="gpt-3.5-turbo"):
+    async def create(cls, chat, lang="es", model="gpt-3.5-turbo", settings=None):
         self = ChatGPT(chat, lang, model)
-        self.api = proxies.api_cache[self.chat.id][0] if self.chat.id in proxies.api_cache else await proxies.db.get_chat_attribute(self.chat, f'{constant_db_api}')
+        self.settings = settings or await proxies.db.load_settings(self.chat)
+        self.api = self.settings.api
         self.chat_info = await self._get_chat_info()
         return self
 
@@ -51,7 +52,7 @@ class ChatGPT:
         from bot.src.utils.preprocess.make_prompt import handle as mpm
         try:
             from bot.src.utils.preprocess import count_tokens
-            data, completion_tokens, _ = await count_tokens.putos_tokens(self.chat, _message)
+            data, completion_tokens, _ = await count_tokens.putos_tokens(self.chat, _message, self.settings)
             self.diccionario["max_tokens"] = completion_tokens
             self.chat_mode = chat_mode
             messages, prompt = (await mms(self, _message, data, chat_mode), None) if self.model not in proxies.config.model["text_completions"] else (None, await mpm(self, _message, data, chat_mode))
@@ -0,0 +1,100 @@
+import os
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import TemporaryDirectory, mkstemp
+from time import monotonic
+
+class ImageStore:
+    # grupos de imágenes generadas por message_id. Todas expiran tras el mismo ttl, así que el orden
+    # de llegada es el orden de expiración y sweep solo mira el principio de la cola.
+    def __init__(self, name: str, max_size: int, ttl: float, max_ram: int = 0):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_ram = max_ram  # bytes en memoria; pasado el límite van a disco (0 = sin límite)
+        self.entries = OrderedDict()  # key -> (expira, [(media, filename)], bytes en memoria)
+        self.pending = set()  # grupos que se están enviando
+        self.ram = 0
+        self.directory = None  # TemporaryDirectory del store, se crea con la primera imagen que va a disco
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spilled = 0
+
+    def spill(self, payload: bytes) -> Path:
+        if self.directory is None:
+            self.directory = TemporaryDirectory(prefix="imagenes-")
+        fd, path = mkstemp(suffix=".png", dir=self.directory.name)
+        with os.fdopen(fd, "wb") as file:
+            file.write(payload)
+        self.spilled += 1
+        return Path(path)
+
+    def put(self, key, documents: list):
+        # documents: [(media, filename)], media es una url o los bytes de la imagen
+        self.remove(key)
+        stored = []
+        ram = 0
+        for media, filename in documents:
+            if isinstance(media, bytes):
+                if self.max_ram and self.ram + ram + len(media) > self.max_ram:
+                    media = self.spill(media)
+                else:
+                    ram += len(media)
+            stored.append((media, filename))
+        self.entries[key] = (monotonic() + self.ttl, stored, ram)
+        self.ram += ram
+        while len(self.entries) > self.max_size:
+            self.discard(next(iter(self.entries)))
+            self.evictions += 1
+
+    def get(self, key):
+        item = self.entries.get(key)
+        if item is not None and item[0] <= monotonic():
+            self.discard(key)
+            self.evictions += 1
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[1]
+
+    def remove(self, key) -> bool:
+        if key not in self.entries:
+            return False
+        self.discard(key)
+        return True
+
+    def discard(self, key):
+        _, documents, ram = self.entries.pop(key)
+        self.ram -= ram
+        for media, _ in documents:
+            if isinstance(media, Path):
+                media.unlink(missing_ok=True)
+
+    def close(self):
+        # al apagar: los grupos no sobreviven al proceso, la carpeta tampoco
+        self.entries.clear()
+        self.ram = 0
+        if self.directory is not None:
+            self.directory.cleanup()
+            self.directory = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def sweep(self) -> int:
+        expired = 0
+        while self.entries:
+            key, (expires, _, _) = next(iter(self.entries.items()))
+            if expires > monotonic():
+                break
+            self.discard(key)
+            expired += 1
+        self.evictions += expired
+        return expired
+
+    def stats(self) -> dict:
+        return {"name": self.name, "size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "ram": self.ram, "spilled": self.spilled}
@@ -0,0 +1,71 @@
+from ujson import dumps, loads
+from pathlib import Path
+
+DELETED = object()
+
+class Append:
+    # agrega un elemento a la lista de la ruta en vez de reescribirla
+    __slots__ = ("item",)
+
+    def __init__(self, item):
+        self.item = item
+
+def apply_record(data: dict, record: dict):
+    target = data.setdefault(record["k"], {})
+    *parents, last = record["p"]
+    for part in parents:
+        target = target.setdefault(part, {})
+    if record.get("d"):
+        target.pop(last, None)
+    elif "a" in record:
+        target.setdefault(last, []).append(record["a"])
+    else:
+        target[last] = record["v"]
+
+class Journal:
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = None
+
+    def replay(self, data: dict) -> int:
+        if not self.path.exists():
+            return 0
+        count = 0
+        with self.path.open(encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = loads(line)
+                except ValueError:
+                    # última línea incompleta por un cierre inesperado
+                    break
+                apply_record(data, record)
+                count += 1
+        return count
+
+    def append(self, records: list):
+        lines = []
+        for key, path, value in records:
+            record = {"k": key, "p": path}
+            if value is DELETED:
+                record["d"] = 1
+            elif isinstance(value, Append):
+                record["a"] = value.item
+            else:
+                record["v"] = value
+            lines.append(dumps(record, ensure_ascii=False) + "\n")
+        if self.file is None:
+            self.file = self.path.open("a", encoding="utf-8")
+        self.file.write("".join(lines))
+        self.file.flush()
+
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def truncate(self):
+        self.close()
+        self.path.open("w", encoding="utf-8").close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
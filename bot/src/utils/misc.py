@@ -1,5 +1,4 @@
-from udatetime import now
-from .constants import constant_db_model, constant_db_tokens
+from .constants import constant_db_tokens
 from bot.src.utils.preprocess import tokenizer
 
 async def send_large_message(text, update):
@@ -13,30 +12,49 @@ async def send_large_message(text, update):
             await update.effective_chat.send_message(f'{part}', reply_to_message_id=update.effective_message.message_id, disable_web_page_preview=True, parse_mode=ParseMode.MARKDOWN)
 
 async def clean_text(doc, chat):
-    max_tokens = await ver_modelo_get_tokens(chat)
-    doc, tokencount, advertencia = await tokenizer.handle(input_data=doc, max_tokens=max_tokens)
+    from .proxies import db
+    settings = await db.load_settings(chat)
+    max_tokens = await ver_modelo_get_tokens(chat, model=settings.model)
+    doc, tokencount, advertencia = await tokenizer.handle(input_data=doc, max_tokens=max_tokens, counter=tokenizer.get(settings.model, settings.api))
     return doc, tokencount, advertencia
 
-async def update_dialog_messages(chat, new_dialog_message=None):
+async def update_dialog_messages(chat, new_dialog_message=None, last_interaction=None, settings=None):
+    from .proxies import db
+    if new_dialog_message is None:
+        settings, dialog = await db.load_turn_context(chat, settings=settings)
+    elif settings is None:
+        settings = await db.load_settings(chat)
+    dialog_id = settings.current_dialog_id
+    max_tokens = await ver_modelo_get_tokens(chat, model=settings.model)
+    counter = tokenizer.get(settings.model, settings.api)
+    if new_dialog_message is None:
+        dialog_messages, tokencount, advertencia = await tokenizer.handle(input_data=dialog["messages"] if dialog else [], max_tokens=max_tokens, counter=counter)
+        await db.commit_turn(chat, dialog_id, dialog_messages, int(tokencount), last_interaction)
+        return advertencia, int(tokencount)
+    # solo se tokeniza y se envía el mensaje nuevo
+    new_messages, new_tokens, advertencia = await tokenizer.handle(input_data=[new_dialog_message], max_tokens=max_tokens, counter=counter)
+    if not new_messages:
+        # no se guarda ningún mensaje, pero la interacción sí cuenta
+        if last_interaction is not None:
+            await db.set_last_interaction(chat, last_interaction)
+        return True, int(await db.get_dialog_attribute(chat, constant_db_tokens) or 0)
+    tokencount = await db.push_dialog_message(chat, dialog_id, new_messages[0], int(new_tokens), last_interaction)
+    if tokencount > max_tokens:
+        advertencia, tokencount = await trim_dialog_messages(chat, dialog_id, max_tokens, counter)
+    return advertencia, int(tokencount)
+
+async def trim_dialog_messages(chat, dialog_id, max_tokens, counter=None):
     from .proxies import db
-    dialog_messages = await db.get_dialog_messages(chat, dialog_id=None)
-    max_tokens = await ver_modelo_get_tokens(chat)
-    if new_dialog_message is not None: dialog_messages += [new_dialog_message]
-    dialog_messages, tokencount, advertencia = await tokenizer.handle(input_data=dialog_messages, max_tokens=max_tokens)
-    await db.set_dialog_messages(
-        chat,
-        dialog_messages,
-        dialog_id=None
-    )
-    await db.set_dialog_attribute(chat, f'{constant_db_tokens}', int(tokencount))
-    return advertencia, dialog_messages, int(tokencount)
+    dialog_messages = await db.get_dialog_messages(chat, dialog_id)
+    kept_messages, tokencount, advertencia = await tokenizer.handle(input_data=dialog_messages, max_tokens=max_tokens, counter=counter)
+    await db.trim_dialog_messages(chat, dialog_id, len(dialog_messages) - len(kept_messages), int(tokencount))
+    return advertencia, int(tokencount)
 
 async def ver_modelo_get_tokens(chat=None, model=None, api=None):
     try:
-        from .proxies import db, model_cache
+        from .proxies import db
         if not model:
-            model = model_cache[chat.id][0] if model_cache.get(chat.id) else await db.get_chat_attribute(chat, f'{constant_db_model}')
-            model_cache[chat.id] = (model, now())
+            model = (await db.load_settings(chat)).model
 
         from bot.src.utils.config import model as modelist, api as apilist
         if api and apilist["info"][api].get("api_max_tokens"):
@@ -1,53 +1,52 @@
-from bot.src.utils import config
-from bot.src.utils.proxies import db, chat_mode_cache, model_cache, lang_cache, api_cache
-from bot.src.utils.constants import constant_db_tokens, constant_db_chat_mode, constant_db_model, constant_db_lang, constant_db_api
+from bisect import bisect_left
+from itertools import accumulate
+from bot.src.utils.proxies import db
 from bot.src.utils.misc import ver_modelo_get_tokens, tokenizer
+from bot.src.utils.preprocess import prompts
 
-async def putos_tokens(chat, _message):
+async def putos_tokens(chat, _message, settings=None):
     try:
-        if chat.id in chat_mode_cache and chat.id in model_cache and chat.id in api_cache and chat.id in lang_cache:
-            chat_mode = chat_mode_cache.get(chat.id)[0]
-            current_model = model_cache[chat.id][0]
-            current_api = api_cache[chat.id][0]
-            language = lang_cache[chat.id][0]
-        else:
-            db_args = [constant_db_chat_mode, constant_db_model, constant_db_api, constant_db_lang]
-            db_call = await db.get_chat_attributes_dict(chat, db_args)
-            
-            chat_mode = db_call[constant_db_chat_mode]
-            current_model = db_call[constant_db_model]
-            current_api = db_call[constant_db_api]
-            language = db_call[constant_db_lang]
+        settings, dialog = await db.load_turn_context(chat, settings=settings)
+        chat_mode = settings.chat_mode
 
-        max_tokens = await ver_modelo_get_tokens(None, model=current_model, api=current_api)
+        max_tokens = await ver_modelo_get_tokens(None, model=settings.model, api=settings.api)
+        counter = tokenizer.get(settings.model, settings.api)
 
-        dialog_messages = await db.get_dialog_messages(chat, dialog_id=None)
-        data, dialogos_tokens = await reconteo_tokens(chat, dialog_messages, max_tokens)
+        stored_messages = dialog["messages"] if dialog else []
+        # el mensaje nuevo y los campos del historial que aún no tienen conteo van en un solo lote
+        dialog_messages, (message_count,) = tokenizer.fill_counts(stored_messages, [_message], counter)
+        # mensajes viejos sin conteo (o contados con otro tokenizer): se guardan una sola vez
+        backfill = any(message is not stored for message, stored in zip(dialog_messages, stored_messages))
+        data, dialogos_tokens = await reconteo_tokens(dialog_messages, max_tokens, counter)
+        # el tokenizer solo quita mensajes del principio
+        corte = len(dialog_messages) - len(data)
         
-        language = config.lang[language]["info"]["name"]
-        especificacionlang = config.especificacionlang.format(language=language)
-        prompter = config.chat_mode["info"][chat_mode]["prompt_start"].format(language=language)
-        injectprompt = """{especificarlang}\n\n{elprompt}\n\n{especificarlang}\n\n{_message}"""
-        pre_tokens = injectprompt.format(especificarlang=especificacionlang, elprompt=prompter, _message=_message)
-        _, mensaje_tokens = await reconteo_tokens(chat, pre_tokens, max_tokens)
+        # el prompt de sistema ya viene contado
+        # igual que el tokenizer, un mensaje enorme cuenta como mucho max_tokens - 500
+        mensaje_tokens = min(prompts.get(chat_mode, settings.lang, counter)[1] + message_count, max_tokens - 500)
 
-        await db.set_dialog_attribute(chat, f'{constant_db_tokens}', dialogos_tokens + mensaje_tokens)
+        # si no queda espacio para la respuesta se quitan los mensajes más viejos en una sola pasada:
+        # con las sumas acumuladas se busca el primer corte que deja el diálogo dentro del presupuesto
+        presupuesto = (max_tokens - mensaje_tokens - 300) / 1.15
+        if dialogos_tokens > presupuesto:
+            acumulado = list(accumulate((tokenizer.message_tokens(message) for message in data), initial=0))
+            recorte = min(bisect_left(acumulado, dialogos_tokens - presupuesto), len(data))
+            data = data[recorte:]
+            dialogos_tokens = max(dialogos_tokens - acumulado[recorte], 0)
+            corte += recorte
         completion_tokens = int(max_tokens - dialogos_tokens - mensaje_tokens - (dialogos_tokens * 0.15) - 300)
-        while completion_tokens < 0:
-            if len(data) > 0:
-                data.pop(0)
-            data, dialogos_tokens = await reconteo_tokens(chat, data, max_tokens)
-            completion_tokens = int(max_tokens - dialogos_tokens - mensaje_tokens - (dialogos_tokens * 0.15) - 300)
+        # un max_tokens negativo o cero lo rechaza la API con un error confuso
+        if completion_tokens < 1:
+            raise ValueError(f'no queda espacio para la respuesta: max_tokens={max_tokens}, prompt={mensaje_tokens}, dialogo={dialogos_tokens}')
+        # solo se escribe si algo cambió: el recorte manda cuántos mensajes quitar, no el diálogo que queda
+        if backfill:
+            await db.commit_turn(chat, settings.current_dialog_id, dialog_messages[corte:], dialogos_tokens)
+        elif corte > 0:
+            await db.trim_dialog_messages(chat, settings.current_dialog_id, corte, dialogos_tokens)
         return data, completion_tokens, chat_mode
     except Exception as e:
         raise ValueError(f'<count_tokens.putos_tokens> {e}')
 
-async def reconteo_tokens(chat, input_data, max_tokens):
-    data, dialogos_tokens, _ = await tokenizer.handle(input_data, max_tokens)
-    if isinstance(data, list):
-        await db.set_dialog_messages(
-            chat,
-            data,
-            dialog_id=None
-        )
+async def reconteo_tokens(input_data, max_tokens, counter=None):
+    data, dialogos_tokens, _ = await tokenizer.handle(input_data, max_tokens, counter)
     return data, dialogos_tokens
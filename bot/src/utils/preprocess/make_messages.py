@@ -1,5 +1,6 @@
 from bot.src.utils import config
 from bot.src.utils.constants import continue_key
+from bot.src.utils.preprocess import prompts
 
 def append_resources_messages(self, messages, dialog_messages):
     documento_texts = []
@@ -39,14 +40,8 @@ def append_user_bot_messages(messages, dialog_messages):
     return messages
 
 def append_chat_mode(self, chat_mode, messages):
-    language = config.lang[self.lang]["info"]["name"]
-    if chat_mode in ["imagen", "translate"]:
-        messages.append({"role": "system", "content": f'{config.chat_mode["info"][chat_mode]["prompt_start"].format(language=language)}'})
-    elif chat_mode != "nada":
-        especificacionlang = config.especificacionlang.format(language=language)
-        prompter = config.chat_mode["info"][chat_mode]["prompt_start"].format(language=language)
-        injectprompt = """{especificarlang}\n\n{elprompt}\n\n{especificarlang}\n\n"""
-        messages.append({"role": "system", "content": injectprompt.format(especificarlang=especificacionlang, elprompt=prompter)})
+    if chat_mode != "nada":
+        messages.append({"role": "system", "content": prompts.get(chat_mode, self.lang)[0]})
     return messages
 
 def continue_or_append_latest_message(_message, messages):
@@ -1,5 +1,6 @@
 from bot.src.utils import config
 from bot.src.utils.constants import continue_key
+from bot.src.utils.preprocess import prompts
 
 def get_resources_texts(dialog_messages, key):
     texts = []
@@ -39,22 +40,8 @@ def get_prompt_lines(dialog_messages, chat_mode, lang):
                 prompt_lines.append(f' {bot_text}')
     return "".join(prompt_lines)
 
-def get_injectprompt(language, prompter):
-    especificacionlang = config.especificacionlang.format(language=language)
-    injectprompt = """{especificarlang}\n\n{elprompt}\n\n{especificarlang}\n\n"""
-    return injectprompt.format(especificarlang=especificacionlang, elprompt=prompter)
-    
 def append_chat_mode(self, chat_mode):
-    language = config.lang[self.lang]["info"]["name"]
-    if chat_mode in ["imagen", "translate"]:
-        return f'{config.chat_mode["info"][chat_mode]["prompt_start"].format(language=language)}'
-    elif chat_mode != "nada":
-        prompter = config.chat_mode["info"][chat_mode]["prompt_start"].format(language=language)
-        if chat_mode != "translate":
-            return get_injectprompt(language, prompter)
-        else:
-            return prompter
-    return ""
+    return prompts.get(chat_mode, self.lang)[0]
 
 def continue_or_append_latest_message(self, _message, prompt, chat_mode):
     if _message == continue_key:
@@ -0,0 +1,45 @@
+from bot.src.utils import config
+from bot.src.utils.preprocess import tokenizer
+
+# (chat_mode, lang) -> (prompt de sistema, {tokenizer: tokens}); se arma al iniciar
+table = {}
+built_for = None
+
+def source():
+    # si se recarga config cambian estos objetos y la tabla se vuelve a armar
+    return (id(config.chat_mode), id(config.lang), config.especificacionlang)
+
+def render(chat_mode, lang):
+    if chat_mode == "nada":
+        return ""
+    language = config.lang[lang]["info"]["name"]
+    prompter = config.chat_mode["info"][chat_mode]["prompt_start"].format(language=language)
+    if chat_mode in ["imagen", "translate"]:
+        return prompter
+    especificacionlang = config.especificacionlang.format(language=language)
+    injectprompt = """{especificarlang}\n\n{elprompt}\n\n{especificarlang}\n\n"""
+    return injectprompt.format(especificarlang=especificacionlang, elprompt=prompter)
+
+def build():
+    global table, built_for
+    new_table = {}
+    for chat_mode in config.chat_mode["info"]:
+        for lang in config.available_lang:
+            prompt = render(chat_mode, lang)
+            new_table[(chat_mode, lang)] = (prompt, {})
+    # con el tokenizer por defecto se cuentan todos juntos; los demás se cuentan al pedirlos
+    counter = tokenizer.get()
+    for (prompt, counts), count in zip(new_table.values(), counter.count_batch([prompt for prompt, _ in new_table.values()])):
+        counts[counter.name] = count
+    table = new_table
+    built_for = source()
+    return len(table)
+
+def get(chat_mode, lang, counter=None):
+    if built_for != source():
+        build()
+    counter = counter or tokenizer.get()
+    prompt, counts = table[(chat_mode, lang)]
+    if counter.name not in counts:
+        counts[counter.name] = counter.count(prompt)
+    return prompt, counts[counter.name]
@@ -1,14 +1,14 @@
+import re
+from collections import Counter
 from bot.src.utils import config
+from bot.src.utils.cache import Cache
 from bot.src.utils.constants import logger
-from langdetect import detect_langs
 from nltk import download, set_proxy
 if config.proxy_raw is not None:
     print(f"Proxy: {config.proxy_raw}")
     set_proxy(config.proxy_raw)
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 download('stopwords', quiet=True)
-download('punkt', quiet=True)
 
 languages_map={"ar": "arabic","bg": "bulgarian","ca": "catalan","cz": "czech","da": "danish","nl": "dutch","en": "english","fi": "finnish","fr": "french","de": "german","hi": "hindi","hu": "hungarian","id": "indonesian","it": "italian","nb": "norwegian","pl": "polish","pt": "portuguese","ro": "romanian","ru": "russian","sk": "slovak","es": "spanish","sv": "swedish","tr": "turkish","uk": "ukrainian","vi": "vietnamese"}
 
@@ -47,7 +47,7 @@ async def procesar_texto(value, idioma):
 async def procesar_texto_normal(texto, idioma=None, lock=None):
     textofiltrr=None
     if texto:
-        if not idioma: idioma = detect_langs(texto)[0].lang
+        if not idioma: idioma = detectar_idioma(texto)
         textofiltrr = await filtrar_palabras_irrelevantes(texto, idioma)
     if textofiltrr:
         if lock: return "".join(textofiltrr)
@@ -56,22 +56,38 @@ async def procesar_texto_normal(texto, idioma=None, lock=None):
         logger.error(f"{__name__}: No se detectó ningún idioma en el texto.")
 
 
-cached_stopwords = {}
+# stopwords de todos los idiomas al importar, y al revés: palabra -> idiomas que la tienen
+cached_stopwords = {idioma: frozenset(stopwords.words(nombre)) for idioma, nombre in languages_map.items() if nombre in stopwords.fileids()}
+idiomas_por_palabra = {}
+for idioma, palabras in cached_stopwords.items():
+    for palabra in palabras:
+        idiomas_por_palabra.setdefault(palabra, []).append(idioma)
+
+no_palabra = re.compile(r"[^\w\s]+")
+muestra_idioma = 4000  # caracteres que se miran para detectar el idioma
+idiomas_detectados = Cache("idiomas", config.cache_max_size, config.cache_ttl_minutes * 60)
+# None también se guarda (texto sin stopwords conocidas)
+sin_detectar = object()
+
+def detectar_idioma(texto):
+    # el idioma con más stopwords en el principio del texto; None si no aparece ninguna
+    muestra = texto[:muestra_idioma]
+    clave = hash(muestra)
+    idioma = idiomas_detectados.get(clave, sin_detectar)
+    if idioma is not sin_detectar:
+        return idioma
+    votos = Counter()
+    for palabra in no_palabra.sub("", muestra).lower().split():
+        votos.update(idiomas_por_palabra.get(palabra, ()))
+    idioma = votos.most_common(1)[0][0] if votos else None
+    idiomas_detectados[clave] = idioma
+    return idioma
 
 async def filtrar_palabras_irrelevantes(texto, idioma):
-    import re
-    texto = re.sub(r"[^a-zA-Z0-9\s]", '', texto)
-    texto = re.sub(r'[\n\r]+', ' ', texto)
-    texto = re.sub(r' {2,}', ' ', texto)
-    texto = texto.strip()
-    if idioma in cached_stopwords: palabras_irrelevantes = cached_stopwords[idioma]
-    elif languages_map.get(idioma) in stopwords.fileids():
-        palabras_irrelevantes = set(stopwords.words(languages_map[idioma]))
-        cached_stopwords[idioma] = palabras_irrelevantes
-    else: return texto
-    palabras = word_tokenize(texto)
-    palabras_filtradas = [palabra for palabra in palabras if palabra.lower() not in palabras_irrelevantes]
-    return " ".join(palabras_filtradas)
+    palabras = no_palabra.sub("", texto).split()
+    palabras_irrelevantes = cached_stopwords.get(idioma)
+    if palabras_irrelevantes is None: return " ".join(palabras)
+    return " ".join([palabra for palabra in palabras if palabra.lower() not in palabras_irrelevantes])
 
 async def handle(texto):
     resultado = await deteccion(texto)
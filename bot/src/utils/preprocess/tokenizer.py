@@ -1,46 +1,185 @@
+import os
+import asyncio
+from collections import deque
+from math import ceil
 from tiktoken import get_encoding
+from tiktoken.model import encoding_name_for_model
 import bot.src.utils.preprocess.remove_words as remove_words
 from typing import List, Dict, Any, Tuple
 
-encoding = get_encoding("cl100k_base")
+# con pocos textos el lote no compensa: encode_ordinary_batch arma un pool de hilos en cada llamada;
+# con una sola CPU nunca compensa (benchmarks/tokenizer.py: 3.1 ms en lote contra 2.0 ms por campo en 50 mensajes)
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+batch_min = 8 if cpus > 1 else float("inf")
 
-async def handle(input_data: str | List[Dict[str, Any]], max_tokens: int) -> str | List[Dict] | Tuple[int, bool]:
+class Exact:
+    # codificación de tiktoken; se carga la primera vez que se usa
+    def __init__(self, name):
+        self.name = name
+        self._encoding = None
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = get_encoding(self.name)
+        return self._encoding
+
+    def count(self, text):
+        return len(self.encoding.encode_ordinary(text))
+
+    def count_batch(self, texts):
+        if len(texts) < batch_min:
+            return [self.count(text) for text in texts]
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+
+    def tail(self, text, max_tokens):
+        # los últimos max_tokens tokens del texto
+        tokens = self.encoding.encode_ordinary(text)[-max_tokens:] if max_tokens > 0 else []
+        return self.encoding.decode(tokens), len(tokens)
+
+class Approx:
+    # estimación para modelos sin tokenizer conocido: caracteres (o bytes utf-8) por token, redondeando hacia arriba
+    def __init__(self, unit, per_token):
+        self.name = f"approx:{unit}:{per_token}"
+        self.bytes = unit == "bytes"
+        self.per_token = float(per_token)
+
+    def size(self, text):
+        return len(text.encode()) if self.bytes else len(text)
+
+    def count(self, text):
+        return ceil(self.size(text) / self.per_token)
+
+    def count_batch(self, texts):
+        return [self.count(text) for text in texts]
+
+    def tail(self, text, max_tokens):
+        keep = int(max_tokens * self.per_token)
+        if self.bytes:
+            text = text.encode()[-keep:].decode(errors="ignore") if keep > 0 else ""
+        else:
+            text = text[-keep:] if keep > 0 else ""
+        return text, self.count(text)
+
+# antes de esto todos los conteos guardados se hacían con cl100k_base
+default_name = "cl100k_base"
+# nombre -> tokenizer, se crean a medida que algún modelo los pide
+registry = {}
+
+def tokenizer_name(model=None, api=None):
+    # "tokenizer" en api.json (como api_max_tokens) o en model.json: un nombre de tiktoken o "approx"
+    # con "chars_per_token" o "bytes_per_token"; si no hay, el que tiktoken conoce para el modelo
+    from bot.src.utils.config import model as modelist, api as apilist
+    info = apilist["info"].get(api, {}) if api else {}
+    if not info.get("tokenizer"):
+        info = modelist["info"].get(model, {}) if model else {}
+    name = info.get("tokenizer")
+    if name == "approx":
+        unit = "bytes" if info.get("bytes_per_token") else "chars"
+        return f"approx:{unit}:{float(info.get(f'{unit}_per_token') or 4)}"
+    if name:
+        return name
+    try:
+        return encoding_name_for_model(model) if model else default_name
+    except KeyError:
+        return default_name
+
+def get(model=None, api=None):
+    name = tokenizer_name(model, api)
+    counter = registry.get(name)
+    if counter is None:
+        if name.startswith("approx:"):
+            _, unit, per_token = name.split(":")
+            counter = Approx(unit, per_token)
+        else:
+            counter = Exact(name)
+        registry[name] = counter
+    return counter
+
+def load(counter):
+    try:
+        counter.encoding
+        return None
+    except Exception as e:
+        return f"{counter.name}: {e}"
+
+async def preload() -> Tuple[list, list]:
+    # get_encoding baja y arma el BPE la primera vez; en el loop pararía todos los chats,
+    # así que al arrancar se cargan en un hilo las de todos los modelos configurados.
+    # Si una falla (sin red, por ejemplo) se vuelve a intentar cuando un chat la pida
+    from bot.src.utils.config import api as apilist
+    counters = {get()} | {get(model, api) for api in apilist["available_api"] for model in apilist["info"][api].get("available_model", [])}
+    exact = sorted((counter for counter in counters if isinstance(counter, Exact)), key=lambda counter: counter.name)
+    errors = await asyncio.get_running_loop().run_in_executor(None, lambda: [load(counter) for counter in exact])
+    return [counter.name for counter, error in zip(exact, errors) if error is None], [error for error in errors if error]
+
+async def handle(input_data: str | List[Dict[str, Any]], max_tokens: int, counter=None) -> str | List[Dict] | Tuple[int, bool]:
     max_tokens = int(max_tokens)
+    counter = counter or get()
     try:
         if isinstance(input_data, str):
-            tokens = encoding.encode(input_data)
+            tokens = counter.count(input_data)
             advertencia=None
-            if len(tokens) > max_tokens:
+            if tokens > max_tokens:
                 input_data = await remove_words.handle(texto=input_data)
-                tokens = encoding.encode(input_data)
-                if len(tokens) > max_tokens:
+                tokens = counter.count(input_data)
+                if tokens > max_tokens:
                     buffer_tokens = 500
-                    start_index = len(tokens) - (max_tokens - buffer_tokens)
-                    tokens = tokens[start_index:]
+                    input_data, tokens = counter.tail(input_data, max_tokens - buffer_tokens)
                     advertencia = True
-            out_tokens = int(len(tokens))
-            return str(encoding.decode(tokens)), out_tokens, bool(advertencia)
+            return str(input_data), int(tokens), bool(advertencia)
         elif isinstance(input_data, list):
-            output_data, total_tokens, advertencia = await process_input_data(input_data, max_tokens)
+            output_data, total_tokens, advertencia = await process_input_data(input_data, max_tokens, counter)
             return list(output_data), int(total_tokens), bool(advertencia)
     except Exception as e:
         raise ValueError("tokenizer", {e})
 
 keys = ["user", "bot", "func_cont", "url", "documento", "search"]
 
-async def process_input_data(input_data, max_tokens):
-    output_data = []
+def cached_counts(message, counter):
+    # los conteos guardados solo sirven si se hicieron con el mismo tokenizer
+    if message.get("tokenizer", default_name) != counter.name:
+        return {}
+    return message.get("tokens") or {}
+
+def fill_counts(input_data, extra=(), counter=None):
+    # junta los campos sin conteo de todos los mensajes (y los textos extra del turno) y los cuenta en un solo lote;
+    # devuelve mensajes nuevos con "tokens" completo, sin tocar los originales, y los conteos de extra
+    counter = counter or get()
+    texts = [str(text) for text in extra]
+    pending = []
+    for index, message in enumerate(input_data):
+        cached = cached_counts(message, counter)
+        for key, value in message.items():
+            if key in keys and key not in cached:
+                pending.append((index, key))
+                texts.append(str(value))
+    if not texts:
+        return list(input_data), []
+    counts = counter.count_batch(texts)
+    output_data = list(input_data)
+    for (index, key), count in zip(pending, counts[len(extra):]):
+        message = output_data[index]
+        if message is input_data[index]:
+            message = output_data[index] = {**message, "tokens": dict(cached_counts(message, counter)), "tokenizer": counter.name}
+        message["tokens"][key] = count
+    return output_data, counts[:len(extra)]
+
+def message_tokens(message):
+    # lo mismo que suma process_message: tokens de cada campo + 3
+    return sum(tokens + 3 for tokens in message["tokens"].values())
+
+async def process_input_data(input_data, max_tokens, counter=None):
+    counter = counter or get()
+    output_data = deque()
     total_tokens = 0
     advertencia = None
+    input_data, _ = fill_counts(input_data, counter=counter)
     for message in input_data:
-        new_message, tokens_in_message = await process_message(message, max_tokens)
+        new_message, tokens_in_message = await process_message(message, max_tokens, counter)
         
-        while total_tokens + tokens_in_message > max_tokens:
-            if len(output_data) == 0:
-                break
-            removed_message = output_data.pop(0)  # Elimina el mensaje más antiguo
-            removed_tokens = sum(len(encoding.encode(removed_message[key])) for key in keys if removed_message.get(key))
-            total_tokens -= removed_tokens
+        while total_tokens + tokens_in_message > max_tokens and output_data:
+            total_tokens -= message_tokens(output_data.popleft())  # Elimina el mensaje más antiguo
             advertencia = True
 
         if total_tokens + tokens_in_message > max_tokens:
@@ -51,28 +190,33 @@ async def process_input_data(input_data, max_tokens):
 
     return output_data, total_tokens, advertencia
 
-async def process_message(message, max_tokens):
+async def process_message(message, max_tokens, counter=None):
+    counter = counter or get()
     total_tokens = 0
     new_message = {}
+    # tokens de cada campo, se guardan con el mensaje y solo se codifica lo nuevo
+    cached = cached_counts(message, counter)
+    counts = {}
 
     for key, value in message.items():
         if key in keys:
             content = str(value)
-            tokens = encoding.encode(content)
-            content_tokens = len(tokens)
+            content_tokens = cached[key] if key in cached else counter.count(content)
             if total_tokens + content_tokens > max_tokens:
                 new_content = await remove_words.handle(texto=content)
-                new_tokens = encoding.encode(new_content)
-                content_tokens = len(new_tokens)
+                content_tokens = counter.count(new_content)
             else:
                 new_content = content
             new_message[key] = str(new_content)
+            counts[key] = content_tokens
             total_tokens += (content_tokens + 3)
-        else:
+        elif key not in ("tokens", "tokenizer"):
             new_message[key] = value
 
+    new_message["tokens"] = counts
+    new_message["tokenizer"] = counter.name
     return new_message, total_tokens
 
 
-async def pre_message(input_data: str) -> int:
-    return len(encoding.encode(input_data))
+async def pre_message(input_data: str, counter=None) -> int:
+    return (counter or get()).count(input_data)
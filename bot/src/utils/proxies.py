@@ -1,6 +1,9 @@
 from bot.src.utils.constants import logger
 import asyncio
 from bot.src.utils import config, database
+from bot.src.utils.cache import Cache
+from bot.src.utils.diskcache import DiskCache
+from pathlib import Path
 import telegram
 from telegram import Update
 from telegram.ext import CallbackContext
@@ -17,24 +20,20 @@ chat_tasks = {}
 
 last_apis_interaction = udatetime.now()
 
-#cache testing
-cache_index = ["lang_cache", "chat_mode_cache", "api_cache", "model_cache",
-               "menu_cache", "interaction_cache", "image_api_cache", "image_api_styles_cache",
-               "image_styles_cache"]
-lang_cache = {}
-chat_mode_cache = {}
-api_cache = {}
-image_api_cache = {}
-image_api_styles_cache = {}
-image_styles_cache = {}
-imaginepy_ratios_cache = {}
-imaginepy_styles_cache = {}
-imaginepy_models_cache = {}
-model_cache = {}
-menu_cache = {}
-interaction_cache = {}
+#caches por chat: (valor, now()) con tamaño máximo y expiración
+# los ajustes del chat (idioma, modo, modelo, api...) solo están en db.settings
+def nuevo_cache(name):
+    return Cache(name, config.cache_max_size, config.cache_ttl_minutes * 60)
+# teclados de menú ya generados: no expiran, las claves llevan la versión de las opciones
+menu_cache = Cache("menu", config.cache_max_size, float("inf"))
+interaction_cache = nuevo_cache("interaction")
+cache_index = [menu_cache, interaction_cache, db.settings]
 
-user_names = {}
+# texto extraído de fotos y documentos por file_unique_id de telegram
+file_cache = DiskCache("files", Path("/database/files"), config.file_cache_size, config.file_cache_disk_mb * 1024 * 1024, config.cache_ttl_minutes * 60)
+
+# alias de los usuarios de cada grupo: chat.id -> OrderedDict(user_id -> nombre), se guarda en el chat
+user_names = nuevo_cache("user_names")
 
 msg_no_mod = "Message is not modified"
 
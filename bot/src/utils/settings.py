@@ -0,0 +1,39 @@
+from .constants import (constant_db_lang, constant_db_chat_mode, constant_db_api, constant_db_model,
+                        constant_db_image_api, constant_db_image_api_styles, constant_db_imaginepy_styles,
+                        constant_db_imaginepy_ratios, constant_db_imaginepy_models)
+
+# atributo -> clave en la base de datos
+FIELDS = {
+    "lang": constant_db_lang,
+    "chat_mode": constant_db_chat_mode,
+    "api": constant_db_api,
+    "model": constant_db_model,
+    "image_api": constant_db_image_api,
+    "image_api_styles": constant_db_image_api_styles,
+    "imaginepy_styles": constant_db_imaginepy_styles,
+    "imaginepy_ratios": constant_db_imaginepy_ratios,
+    "imaginepy_models": constant_db_imaginepy_models,
+    "current_dialog_id": "current_dialog_id",
+    "last_interaction": "last_interaction",
+}
+ATTRIBUTES = {key: attribute for attribute, key in FIELDS.items()}
+# claves que los workers tienen en caché (ChatSettings); solo estas se avisan por el bus
+CACHED_KEYS = frozenset(FIELDS.values())
+
+class ChatSettings:
+    # ajustes de un chat, se cargan una vez con una sola proyección y se pasan por todo el update;
+    # es la única caché de estos valores: los checks, menús y comandos leen y escriben aquí
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, chat_dict: dict):
+        for attribute, key in FIELDS.items():
+            setattr(self, attribute, chat_dict.get(key))
+
+    def get(self, key: str, default=None):
+        attribute = ATTRIBUTES.get(key)
+        return getattr(self, attribute) if attribute else default
+
+    def update(self, values: dict):
+        for key, value in values.items():
+            if key in ATTRIBUTES:
+                setattr(self, ATTRIBUTES[key], value)
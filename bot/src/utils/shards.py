@@ -0,0 +1,41 @@
+from ujson import load
+from pathlib import Path
+
+class Shards:
+    # /database/chats/<chat_id>/chat.json + /database/chats/<chat_id>/<dialog_id>.json
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.index_path = directory / "index.json"
+        self.index = {}  # chat_id -> current_dialog_id
+
+    def load_index(self) -> bool:
+        if not self.index_path.exists():
+            return False
+        with self.index_path.open(encoding="utf-8") as file:
+            self.index = load(file)
+        return True
+
+    def path(self, chat_id: str, name: str) -> Path:
+        return self.directory / chat_id / f"{name}.json"
+
+    def read(self, chat_id: str, name: str):
+        path = self.path(chat_id, name)
+        if not path.exists():
+            return None
+        with path.open(encoding="utf-8") as file:
+            return load(file)
+
+    def dialog_ids(self, chat_id: str) -> list:
+        folder = self.directory / chat_id
+        if not folder.exists():
+            return []
+        return [file.stem for file in folder.glob("*.json") if file.stem != "chat"]
+
+    def idle_chats(self, before: float) -> list:
+        # chat.json se reescribe en cada interacción, su mtime sirve de last_interaction
+        idle = []
+        for chat_id in list(self.index):
+            path = self.path(chat_id, "chat")
+            if path.exists() and path.stat().st_mtime < before:
+                idle.append(chat_id)
+        return idle
@@ -0,0 +1,70 @@
+from typing import Optional, Protocol
+from datetime import datetime
+from udatetime import from_string, to_string
+
+def is_datetime(obj):
+    required_attrs = ["year", "month", "day", "hour", "minute", "second", "microsecond"]
+    return all(hasattr(obj, attr) for attr in required_attrs)
+
+def as_datetime(value):
+    return value if is_datetime(value) else from_string(value)
+
+def convert_datetime(data):
+    if isinstance(data, dict):
+        return {key: convert_datetime(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [convert_datetime(item) for item in data]
+    elif is_datetime(data):
+        return to_string(data)
+    else:
+        return data
+
+def set_values(target: dict, values: dict):
+    # como $set de mongo: "user_names.123" cambia solo esa entrada
+    for key, value in values.items():
+        *parents, last = key.split(".")
+        node = target
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[last] = value
+
+def message_tokens(message: dict) -> int:
+    # lo mismo que tokenizer.message_tokens; los mensajes guardados antes de tener conteo no suman
+    return sum(count + 3 for count in (message.get("tokens") or {}).values())
+
+class Storage(Protocol):
+    # Todos los ids son str. Las lecturas devuelven None si el chat o el diálogo no existen
+    # y las escrituras de chats devuelven False; Database convierte eso en el error de siempre.
+    # update_chat acepta claves con punto ("user_names.123") para cambiar una sola entrada.
+    # compact y close son los ganchos de mantenimiento: cada backend hace lo que le toca (el journal JSON, por ejemplo).
+
+    async def ensure_indexes(self) -> None: ...
+    async def compact(self, min_size: int = 0) -> bool: ...
+    async def close(self) -> None: ...
+    async def recent_chat_ids(self, limit: int) -> list: ...
+    async def chat_exists(self, chat_id: str) -> bool: ...
+    async def insert_chat(self, chat_id: str, chat_dict: dict) -> None: ...
+    async def insert_dialog(self, chat_id: str, dialog_id: str) -> bool: ...
+    async def get_chat(self, chat_id: str, keys: Optional[list] = None) -> Optional[dict]: ...
+    async def update_chat(self, chat_id: str, values: dict) -> bool: ...
+    async def update_chats(self, values_by_chat: dict) -> None: ...
+    async def get_dialog(self, chat_id: str, dialog_id: Optional[str], with_messages: bool = True) -> Optional[dict]: ...
+    async def update_dialog(self, chat_id: str, dialog_id: Optional[str], values: dict) -> None: ...
+    async def delete_dialogs_except(self, chat_id: str, dialog_id: Optional[str]) -> None: ...
+    async def load_turn_context(self, chat_id: str, with_messages: bool = True) -> Optional[tuple]: ...
+    async def push_dialog_message(self, chat_id: str, dialog_id: Optional[str], dialog_message: dict, tokens: int) -> int: ...
+    async def trim_dialog_messages(self, chat_id: str, dialog_id: Optional[str], count: int, tokens: int) -> None: ...
+    async def archive_idle_dialogs(self, cutoff: datetime) -> int: ...
+
+def create_storage(backend: str) -> Storage:
+    # import diferido: cada backend trae sus propias dependencias
+    if backend == "json":
+        from .jsonfile import JsonStorage
+        return JsonStorage()
+    if backend == "sqlite":
+        from .sqlite import SqliteStorage
+        return SqliteStorage()
+    if backend == "mongo":
+        from .mongo import MongoStorage
+        return MongoStorage()
+    raise ValueError(f"DATABASE_BACKEND {backend} no existe")
@@ -0,0 +1,353 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Optional
+from pathlib import Path
+from os import replace
+from ujson import load, dump
+from .. import config
+from ..constants import constant_db_tokens
+from ..journal import Journal, DELETED, Append
+from ..shards import Shards
+from ..archive import Archive
+from . import as_datetime, convert_datetime, message_tokens, set_values
+
+class JsonStorage:
+    def __init__(self, directory: Path = Path("/database")):
+        self.directory = directory
+        self.data = None
+        self.journal = None
+        self.shards = None
+        self.loaded = OrderedDict()
+        self.dirty = set()
+        self.pending_records = []
+        self.flush_task = None
+        self.data_files = {
+            "chats": directory / "chats.json",
+            "dialogs": directory / "dialogs.json"
+        }
+        if config.json_layout == "sharded":
+            self.shards = Shards(directory / "chats")
+        elif config.json_journal:
+            self.journal = Journal(directory / "journal.jsonl")
+        # un solo hilo para que las escrituras conserven su orden
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jsondb")
+        self.archive = Archive(directory / "archive")
+        self.load_data_from_json()
+
+    def load_data_from_json(self):
+        self.data = {}
+        if self.shards is not None and self.shards.load_index():
+            self.data = {"chats": {}, "dialogs": {}}
+            return
+        for key, file_path in self.data_files.items():
+            if file_path.exists():
+                with file_path.open(encoding="utf-8") as file:
+                    self.data[key] = load(file)
+            else:
+                self.data[key] = {}
+                self.save_data_to_json(key)  # Guardar datos en el archivo JSON vacío
+        if self.journal:
+            self.journal.replay(self.data)
+            if self.journal.size() > 0:
+                self.write_snapshots(self.take_snapshots())
+        if self.shards is not None:
+            self.migrate_to_shards()
+
+    def migrate_to_shards(self):
+        # primer arranque con JSON_DATABASE_LAYOUT=sharded: se reparten chats.json y dialogs.json
+        legacy_journal = Journal(self.directory / "journal.jsonl")
+        legacy_journal.replay(self.data)
+        for chat_id, chat_dict in self.data["chats"].items():
+            self.write_json(self.shards.path(chat_id, "chat"), convert_datetime(chat_dict))
+            self.shards.index[chat_id] = chat_dict.get("current_dialog_id")
+        for dialog_id, dialog_dict in self.data["dialogs"].items():
+            self.write_json(self.shards.path(dialog_dict["chat_id"], dialog_id), convert_datetime(dialog_dict))
+        self.write_json(self.shards.index_path, self.shards.index)
+        self.data = {"chats": {}, "dialogs": {}}
+
+    def save_data_to_json(self, key: str):
+        self.write_json(self.data_files[key], convert_datetime(self.data[key]))
+
+    def write_json(self, path: Path, data):
+        if data is None:
+            path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as file:
+            dump(data, file, indent=2, ensure_ascii=False)
+        replace(tmp_path, path)
+
+    def take_snapshots(self):
+        return {key: convert_datetime(self.data[key]) for key in self.data_files}
+
+    def write_snapshots(self, snapshots: dict):
+        for key, data in snapshots.items():
+            self.write_json(self.data_files[key], data)
+        self.journal.truncate()
+
+    def persist(self, key: str, chat_id: str, *changes):
+        # changes: (ruta, valor). Sin journal se reescribe el archivo completo en el siguiente flush
+        if self.shards is not None:
+            self.mark_shards(key, chat_id, changes)
+        elif self.journal is None:
+            self.dirty.add(key)
+        else:
+            for path, value in changes:
+                self.pending_records.append((key, path, self.journal_value(value)))
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.delayed_flush())
+
+    def journal_value(self, value):
+        if value is DELETED:
+            return value
+        if isinstance(value, Append):
+            return Append(convert_datetime(value.item))
+        return convert_datetime(value)
+
+    def mark_shards(self, key: str, chat_id: str, changes):
+        if key == "dialogs":
+            for path, _ in changes:
+                self.dirty.add(("dialog", chat_id, path[0]))
+            return
+        self.dirty.add(("chat", chat_id))
+        current_dialog_id = self.data["chats"][chat_id].get("current_dialog_id")
+        if self.shards.index.get(chat_id, False) != current_dialog_id:
+            self.shards.index[chat_id] = current_dialog_id
+            self.dirty.add(("index",))
+
+    def dirty_target(self, key):
+        if key in self.data_files:
+            return self.data_files[key], convert_datetime(self.data[key])
+        if key[0] == "index":
+            return self.shards.index_path, dict(self.shards.index)
+        if key[0] == "chat":
+            return self.shards.path(key[1], "chat"), convert_datetime(self.data["chats"].get(key[1]))
+        return self.shards.path(key[1], key[2]), convert_datetime(self.data["dialogs"].get(key[2]))
+
+    async def run_io(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def json_chat(self, chat_id: str):
+        if self.shards is not None:
+            if chat_id not in self.data["chats"] and chat_id in self.shards.index:
+                chat_dict = await self.run_io(self.shards.read, chat_id, "chat")
+                self.data["chats"].setdefault(chat_id, chat_dict or {})
+            self.touch_shard(chat_id)
+        return self.data["chats"].get(chat_id)
+
+    async def json_dialog(self, chat_id: str, dialog_id: Optional[str]):
+        if not dialog_id:
+            return None
+        if self.shards is not None and dialog_id not in self.data["dialogs"] and ("dialog", chat_id, dialog_id) not in self.dirty:
+            dialog_dict = await self.run_io(self.shards.read, chat_id, dialog_id)
+            if dialog_dict is not None:
+                self.data["dialogs"].setdefault(dialog_id, dialog_dict)
+        if dialog_id not in self.data["dialogs"] and ("dialog", chat_id, dialog_id) not in self.dirty:
+            await self.restore_dialog(chat_id, dialog_id)
+        return self.data["dialogs"].get(dialog_id)
+
+    async def restore_dialog(self, chat_id: str, dialog_id: str):
+        dialog_dict = await self.run_io(self.archive.get, chat_id, dialog_id)
+        if dialog_dict is None or dialog_id in self.data["dialogs"]:
+            return
+        self.data["dialogs"][dialog_id] = dialog_dict
+        self.persist("dialogs", chat_id, ([dialog_id], dialog_dict))
+        # se saca del archivo solo cuando ya está guardado de nuevo
+        await self.flush()
+        await self.run_io(self.archive.remove, chat_id, dialog_id)
+
+    def touch_shard(self, chat_id: str):
+        if chat_id not in self.data["chats"]:
+            return
+        self.loaded[chat_id] = None
+        self.loaded.move_to_end(chat_id)
+        if len(self.loaded) <= config.json_shard_cache:
+            return
+        dirty_chats = {key[1] for key in self.dirty if isinstance(key, tuple) and len(key) > 1}
+        for old_chat_id in list(self.loaded):
+            if len(self.loaded) <= config.json_shard_cache:
+                break
+            if old_chat_id == chat_id or old_chat_id in dirty_chats:
+                continue
+            del self.loaded[old_chat_id]
+            self.data["chats"].pop(old_chat_id, None)
+            for dialog_id in [dialog_id for dialog_id, dialog_dict in self.data["dialogs"].items() if dialog_dict["chat_id"] == old_chat_id]:
+                del self.data["dialogs"][dialog_id]
+
+    async def delayed_flush(self):
+        try:
+            await asyncio.sleep(config.json_flush_seconds)
+        finally:
+            self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if self.pending_records:
+            records, self.pending_records = self.pending_records, []
+            await self.run_io(self.journal.append, records)
+        while self.dirty:
+            await self.run_io(self.write_json, *self.dirty_target(self.dirty.pop()))
+
+    async def ensure_indexes(self):
+        pass
+
+    async def compact(self, min_size: int = 0) -> bool:
+        # vuelca el journal en chats.json/dialogs.json si ya ocupa min_size bytes
+        if self.journal is None:
+            return False
+        await self.flush()
+        if self.journal.size() == 0 or self.journal.size() < min_size:
+            return False
+        await self.run_io(self.write_snapshots, self.take_snapshots())
+        return True
+
+    async def close(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+        if self.journal:
+            self.journal.close()
+        self.executor.shutdown(wait=True)
+
+    async def recent_chat_ids(self, limit: int) -> list:
+        # la pertenencia ya está en memoria
+        return []
+
+    async def chat_exists(self, chat_id: str) -> bool:
+        if self.shards is not None:
+            return chat_id in self.shards.index
+        return bool(self.data["chats"].get(chat_id))
+
+    async def insert_chat(self, chat_id: str, chat_dict: dict):
+        if await self.chat_exists(chat_id):
+            return
+        self.data["chats"][chat_id] = chat_dict
+        self.persist("chats", chat_id, ([chat_id], chat_dict))
+        if self.shards is not None:
+            self.touch_shard(chat_id)
+
+    async def insert_dialog(self, chat_id: str, dialog_id: str) -> bool:
+        chat_dict = await self.json_chat(chat_id)
+        if chat_dict is None:
+            return False
+        self.data["dialogs"][dialog_id] = {
+            "chat_id": chat_id,
+            constant_db_tokens: 0,
+            "messages": [],
+        }
+        chat_dict["current_dialog_id"] = dialog_id
+        self.persist("dialogs", chat_id, ([dialog_id], self.data["dialogs"][dialog_id]))
+        self.persist("chats", chat_id, ([chat_id, "current_dialog_id"], dialog_id))
+        return True
+
+    async def get_chat(self, chat_id: str, keys: Optional[list] = None):
+        chat_dict = await self.json_chat(chat_id)
+        if chat_dict is None or not keys:
+            return chat_dict
+        return {key: chat_dict.get(key, None) for key in keys}
+
+    async def update_chat(self, chat_id: str, values: dict) -> bool:
+        chat_dict = await self.json_chat(chat_id)
+        if chat_dict is None:
+            return False
+        set_values(chat_dict, values)
+        self.persist("chats", chat_id, *[([chat_id, *key.split(".")], value) for key, value in values.items()])  # Guardar datos en el archivo JSON
+        return True
+
+    async def update_chats(self, values_by_chat: dict):
+        for chat_id, values in values_by_chat.items():
+            await self.update_chat(chat_id, values)
+
+    async def get_dialog(self, chat_id: str, dialog_id: Optional[str], with_messages: bool = True):
+        return await self.json_dialog(chat_id, dialog_id)
+
+    async def update_dialog(self, chat_id: str, dialog_id: Optional[str], values: dict):
+        dialog_dict = await self.json_dialog(chat_id, dialog_id)
+        if dialog_dict is not None:
+            dialog_dict.update(values)
+            self.persist("dialogs", chat_id, *[([dialog_id, key], value) for key, value in values.items()])
+
+    async def delete_dialogs_except(self, chat_id: str, dialog_id: Optional[str]):
+        if self.shards is not None:
+            # solo se listan los archivos de este chat
+            stored = set(await self.run_io(self.shards.dialog_ids, chat_id))
+            stored.update(key for key, dialog_data in self.data["dialogs"].items() if dialog_data["chat_id"] == chat_id)
+            removed = [key for key in stored if key != dialog_id]
+        else:
+            removed = [
+                key
+                for key, dialog_data in self.data["dialogs"].items()
+                if dialog_data["chat_id"] == chat_id and key != dialog_id
+            ]
+        for key in removed:
+            self.data["dialogs"].pop(key, None)
+        self.persist("dialogs", chat_id, *[([key], DELETED) for key in removed])
+        # el actual se recupera antes de borrar lo archivado
+        await self.json_dialog(chat_id, dialog_id)
+        await self.run_io(self.archive.discard, chat_id)
+
+    async def load_turn_context(self, chat_id: str, with_messages: bool = True):
+        chat_dict = await self.json_chat(chat_id)
+        if chat_dict is None:
+            return None
+        return chat_dict, await self.json_dialog(chat_id, chat_dict.get("current_dialog_id"))
+
+    async def push_dialog_message(self, chat_id: str, dialog_id: Optional[str], dialog_message: dict, tokens: int) -> int:
+        dialog_dict = await self.json_dialog(chat_id, dialog_id)
+        if dialog_dict is None:
+            return 0
+        dialog_dict["messages"].append(dialog_message)
+        dialog_dict[constant_db_tokens] = int(dialog_dict.get(constant_db_tokens) or 0) + tokens
+        if config.dialog_max_messages and len(dialog_dict["messages"]) > config.dialog_max_messages:
+            # los tokens de los mensajes que se caen también se descuentan
+            dropped = sum(message_tokens(message) for message in dialog_dict["messages"][:-config.dialog_max_messages])
+            dialog_dict[constant_db_tokens] = max(dialog_dict[constant_db_tokens] - dropped, 0)
+            del dialog_dict["messages"][:-config.dialog_max_messages]
+            self.persist("dialogs", chat_id, ([dialog_id, "messages"], dialog_dict["messages"]))
+        else:
+            self.persist("dialogs", chat_id, ([dialog_id, "messages"], Append(dialog_message)))
+        self.persist("dialogs", chat_id, ([dialog_id, constant_db_tokens], dialog_dict[constant_db_tokens]))
+        return dialog_dict[constant_db_tokens]
+
+    async def trim_dialog_messages(self, chat_id: str, dialog_id: Optional[str], count: int, tokens: int):
+        dialog_dict = await self.json_dialog(chat_id, dialog_id)
+        if dialog_dict is not None:
+            del dialog_dict["messages"][:count]
+            dialog_dict[constant_db_tokens] = tokens
+            self.persist("dialogs", chat_id, ([dialog_id, "messages"], dialog_dict["messages"]), ([dialog_id, constant_db_tokens], tokens))
+
+    async def archive_idle_dialogs(self, cutoff) -> int:
+        # mueve los diálogos de chats inactivos al archivo comprimido
+        if self.shards is not None:
+            count = 0
+            for chat_id in await self.run_io(self.shards.idle_chats, cutoff.timestamp()):
+                if chat_id not in self.loaded:
+                    count += await self.run_io(self.archive_shard, chat_id)
+            return count
+
+        idle = {chat_id for chat_id, chat_dict in self.data["chats"].items() if as_datetime(chat_dict["last_interaction"]) < cutoff}
+        archived = {}
+        for dialog_id, dialog_dict in self.data["dialogs"].items():
+            if dialog_dict["chat_id"] in idle:
+                archived.setdefault(dialog_dict["chat_id"], {})[dialog_id] = convert_datetime(dialog_dict)
+        for chat_id, dialogs in archived.items():
+            await self.run_io(self.archive.append, chat_id, dialogs)
+            if as_datetime(self.data["chats"][chat_id]["last_interaction"]) >= cutoff:
+                # el chat volvió mientras se escribía el archivo
+                continue
+            for dialog_id in dialogs:
+                self.data["dialogs"].pop(dialog_id, None)
+            self.persist("dialogs", chat_id, *[([dialog_id], DELETED) for dialog_id in dialogs])
+        return sum(len(dialogs) for dialogs in archived.values())
+
+    def archive_shard(self, chat_id: str) -> int:
+        dialogs = {dialog_id: self.shards.read(chat_id, dialog_id) for dialog_id in self.shards.dialog_ids(chat_id)}
+        if not dialogs:
+            return 0
+        self.archive.append(chat_id, dialogs)
+        for dialog_id in dialogs:
+            self.shards.path(chat_id, dialog_id).unlink(missing_ok=True)
+        return len(dialogs)
@@ -0,0 +1,228 @@
+import asyncio
+from typing import Optional
+from pymongo import ReturnDocument, DeleteOne, ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError, CollectionInvalid, OperationFailure
+from motor.motor_asyncio import AsyncIOMotorClient
+from .. import config
+from ..constants import constant_db_tokens
+
+class MongoStorage:
+    def __init__(self):
+        options = {}
+        if config.mongodb_compressors:
+            # zstd necesita zstandard y snappy python-snappy; zlib viene con python
+            options["compressors"] = config.mongodb_compressors
+        self.client = AsyncIOMotorClient(
+            config.mongodb_uri,
+            maxPoolSize=config.mongodb_pool_size,
+            minPoolSize=config.mongodb_min_pool_size,
+            serverSelectionTimeoutMS=config.mongodb_timeout_ms,
+            **options
+        )
+        self.db = self.client["chatgpt"]
+        self.chats = self.db["chats"]
+        self.dialogs = self.db["dialogs"]
+        self.archived = self.db["dialogs_archive"]
+
+    async def ensure_indexes(self):
+        if "dialogs_archive" not in await self.db.list_collection_names():
+            # el archivo casi no se lee, se guarda con la mayor compresión
+            try:
+                await self.db.create_collection("dialogs_archive", storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}})
+            except CollectionInvalid:
+                # otro worker que arrancó a la vez la creó primero
+                pass
+            except OperationFailure as e:
+                # lo mismo, si el servidor lo detecta antes que el driver (NamespaceExists)
+                if e.code != 48:
+                    raise
+        await asyncio.gather(
+            self.dialogs.create_index("chat_id"),
+            self.chats.create_index("last_interaction"),
+            self.archived.create_index("chat_id"),
+        )
+
+    async def compact(self, min_size: int = 0) -> bool:
+        return False
+
+    async def close(self):
+        self.client.close()
+
+    async def recent_chat_ids(self, limit: int) -> list:
+        cursor = self.chats.find({}, projection={"_id": 1}).sort("last_interaction", -1).limit(limit)
+        return [chat_dict["_id"] async for chat_dict in cursor]
+
+    async def chat_exists(self, chat_id: str) -> bool:
+        return await self.chats.count_documents({"_id": chat_id}, limit=1) > 0
+
+    async def insert_chat(self, chat_id: str, chat_dict: dict):
+        try:
+            await self.chats.insert_one({"_id": chat_id, **chat_dict})
+        except DuplicateKeyError:
+            pass
+
+    async def insert_dialog(self, chat_id: str, dialog_id: str) -> bool:
+        dialog_dict = {
+            "_id": dialog_id,
+            "chat_id": chat_id,
+            constant_db_tokens: 0,
+            "messages": [],
+        }
+        # add new dialog
+        await self.dialogs.insert_one(dialog_dict)
+
+        # update chat's current dialog
+        result = await self.chats.update_one(
+            {"_id": chat_id},
+            {"$set": {"current_dialog_id": dialog_id}}
+        )
+        if result.matched_count == 0:
+            await self.dialogs.delete_one({"_id": dialog_id})
+            return False
+        return True
+
+    async def get_chat(self, chat_id: str, keys: Optional[list] = None):
+        projection = {key: 1 for key in keys} if keys else None
+        return await self.chats.find_one({"_id": chat_id}, projection=projection)
+
+    async def update_chat(self, chat_id: str, values: dict) -> bool:
+        result = await self.chats.update_one({"_id": chat_id}, {"$set": values})
+        return result.matched_count > 0
+
+    async def update_chats(self, values_by_chat: dict):
+        await self.chats.bulk_write([UpdateOne({"_id": chat_id}, {"$set": values}) for chat_id, values in values_by_chat.items()], ordered=False)
+
+    async def get_dialog(self, chat_id: str, dialog_id: Optional[str], with_messages: bool = True):
+        if not dialog_id:
+            return None
+        projection = None if with_messages else {"messages": 0}
+        dialog_dict = await self.dialogs.find_one({"_id": dialog_id, "chat_id": chat_id}, projection=projection)
+        if dialog_dict is None:
+            dialog_dict = await self.restore_dialog(chat_id, dialog_id)
+            if dialog_dict is not None and not with_messages:
+                dialog_dict.pop("messages", None)
+        return dialog_dict
+
+    async def update_dialog(self, chat_id: str, dialog_id: Optional[str], values: dict):
+        await self.dialogs.update_one(
+            {"_id": dialog_id, "chat_id": chat_id},
+            {"$set": values}
+        )
+
+    async def delete_dialogs_except(self, chat_id: str, dialog_id: Optional[str]):
+        await self.restore_dialog(chat_id, dialog_id)
+        await asyncio.gather(
+            self.dialogs.delete_many({"chat_id": chat_id, "_id": {"$ne": dialog_id}}),
+            self.archived.delete_many({"chat_id": chat_id}),
+        )
+
+    async def load_turn_context(self, chat_id: str, with_messages: bool = True):
+        # atributos del chat + diálogo actual en una sola consulta
+        pipeline = [
+            {"$match": {"_id": chat_id}},
+            {"$limit": 1},
+            {"$lookup": {"from": "dialogs", "localField": "current_dialog_id", "foreignField": "_id", "as": "dialog"}},
+        ]
+        if not with_messages:
+            pipeline.append({"$project": {"dialog.messages": 0}})
+        result = await self.chats.aggregate(pipeline).to_list(length=1)
+        if not result:
+            return None
+        chat_dict = result[0]
+        dialog = chat_dict.pop("dialog")
+        if dialog:
+            return chat_dict, dialog[0]
+        dialog_dict = await self.restore_dialog(chat_id, chat_dict.get("current_dialog_id"))
+        if dialog_dict is not None and not with_messages:
+            dialog_dict.pop("messages", None)
+        return chat_dict, dialog_dict
+
+    def push_update(self, dialog_message: dict, tokens: int):
+        if not config.dialog_max_messages:
+            return {"$push": {"messages": dialog_message}, "$inc": {constant_db_tokens: tokens}}
+        # con tope de mensajes: los que se caen restan sus tokens guardados (mismo cálculo que tokenizer.message_tokens)
+        limit = config.dialog_max_messages
+        dropped_tokens = {"$sum": {"$map": {
+            "input": {"$slice": ["$messages", {"$max": ["$_dropped", 1]}]},
+            "as": "message",
+            "in": {"$reduce": {
+                "input": {"$objectToArray": {"$ifNull": ["$$message.tokens", {}]}},
+                "initialValue": 0,
+                "in": {"$add": ["$$value", "$$this.v", 3]}
+            }}
+        }}}
+        return [
+            {"$set": {
+                "messages": {"$concatArrays": [{"$ifNull": ["$messages", []]}, [{"$literal": dialog_message}]]},
+                "_dropped": {"$max": [{"$subtract": [{"$add": [{"$size": {"$ifNull": ["$messages", []]}}, 1]}, limit]}, 0]}
+            }},
+            {"$set": {
+                constant_db_tokens: {"$max": [{"$subtract": [
+                    {"$add": [{"$ifNull": [f"${constant_db_tokens}", 0]}, tokens]},
+                    {"$cond": [{"$gt": ["$_dropped", 0]}, dropped_tokens, 0]}
+                ]}, 0]},
+                "messages": {"$slice": ["$messages", -limit]}
+            }},
+            {"$unset": "_dropped"}
+        ]
+
+    async def push_dialog_message(self, chat_id: str, dialog_id: Optional[str], dialog_message: dict, tokens: int) -> int:
+        for _ in range(2):
+            dialog_dict = await self.dialogs.find_one_and_update(
+                {"_id": dialog_id, "chat_id": chat_id},
+                self.push_update(dialog_message, tokens),
+                projection={"messages": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            # si el diálogo estaba archivado se recupera y se vuelve a intentar
+            if dialog_dict is not None or await self.restore_dialog(chat_id, dialog_id) is None:
+                break
+        return int(dialog_dict.get(constant_db_tokens) or 0) if dialog_dict else 0
+
+    async def trim_dialog_messages(self, chat_id: str, dialog_id: Optional[str], count: int, tokens: int):
+        await self.dialogs.update_one(
+            {"_id": dialog_id, "chat_id": chat_id},
+            [{"$set": {
+                "messages": {"$slice": ["$messages", count, {"$max": [{"$size": "$messages"}, 1]}]},
+                constant_db_tokens: tokens
+            }}]
+        )
+
+    async def restore_dialog(self, chat_id: str, dialog_id: Optional[str]):
+        if not dialog_id:
+            return None
+        dialog_dict = await self.archived.find_one({"_id": dialog_id, "chat_id": chat_id})
+        if dialog_dict is None:
+            return None
+        try:
+            await self.dialogs.insert_one(dialog_dict)
+        except DuplicateKeyError:
+            pass
+        await self.archived.delete_one({"_id": dialog_id})
+        return dialog_dict
+
+    async def archive_idle_dialogs(self, cutoff) -> int:
+        chat_ids = [chat_dict["_id"] async for chat_dict in self.chats.find({"last_interaction": {"$lt": cutoff}}, projection={"_id": 1})]
+        count = 0
+        for start in range(0, len(chat_ids), 100):
+            dialogs = await self.dialogs.find({"chat_id": {"$in": chat_ids[start:start + 100]}}).to_list(length=None)
+            if not dialogs:
+                continue
+            await self.archived.bulk_write([ReplaceOne({"_id": dialog_dict["_id"]}, dialog_dict, upsert=True) for dialog_dict in dialogs], ordered=False)
+            # se borra solo si el chat sigue inactivo y el diálogo no cambió desde la copia
+            idle = {chat_dict["_id"] async for chat_dict in self.chats.find(
+                {"_id": {"$in": list({dialog_dict["chat_id"] for dialog_dict in dialogs})}, "last_interaction": {"$lt": cutoff}},
+                projection={"_id": 1}
+            )}
+            deletes = [
+                DeleteOne({"_id": dialog_dict["_id"], constant_db_tokens: dialog_dict.get(constant_db_tokens), "messages": {"$size": len(dialog_dict.get("messages") or [])}})
+                for dialog_dict in dialogs if dialog_dict["chat_id"] in idle
+            ]
+            if deletes:
+                await self.dialogs.bulk_write(deletes, ordered=False)
+            # los que siguen vivos no se quedan también en el archivo
+            alive = await self.dialogs.distinct("_id", {"_id": {"$in": [dialog_dict["_id"] for dialog_dict in dialogs]}})
+            if alive:
+                await self.archived.delete_many({"_id": {"$in": alive}})
+            count += len(dialogs) - len(alive)
+        return count
@@ -0,0 +1,241 @@
+import asyncio
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from pathlib import Path
+from ujson import dumps, loads
+from .. import config
+from ..constants import constant_db_tokens
+from . import as_datetime, convert_datetime, message_tokens, set_values
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (id TEXT PRIMARY KEY, last_interaction REAL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS chats_last_interaction ON chats (last_interaction);
+CREATE TABLE IF NOT EXISTS dialogs (id TEXT PRIMARY KEY, chat_id TEXT NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS dialogs_chat_id ON dialogs (chat_id);
+CREATE TABLE IF NOT EXISTS messages (dialog_id TEXT NOT NULL, position INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (dialog_id, position)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dialogs_archive (id TEXT PRIMARY KEY, chat_id TEXT NOT NULL, data BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS dialogs_archive_chat_id ON dialogs_archive (chat_id);
+"""
+
+def encode(value) -> str:
+    return dumps(convert_datetime(value), ensure_ascii=False)
+
+def timestamp(value) -> Optional[float]:
+    return as_datetime(value).timestamp() if value else None
+
+class SqliteStorage:
+    # una fila por chat, por diálogo y por mensaje; los atributos van en la columna data como JSON
+    def __init__(self, path: Path = Path("/database/bot.sqlite3")):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # todas las consultas pasan por el mismo hilo
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlitedb")
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def transaction(self, function, *args):
+        # cada llamada desde el bucle es una transacción: todo o nada
+        with self.connection:
+            return function(*args)
+
+    async def run_io(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.transaction, function, *args)
+
+    def read_chat(self, chat_id: str):
+        row = self.connection.execute("SELECT data FROM chats WHERE id = ?", (chat_id,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def write_chat(self, chat_id: str, values: dict) -> bool:
+        chat_dict = self.read_chat(chat_id)
+        if chat_dict is None:
+            return False
+        set_values(chat_dict, convert_datetime(values))
+        self.connection.execute(
+            "UPDATE chats SET data = ?, last_interaction = ? WHERE id = ?",
+            (encode(chat_dict), timestamp(chat_dict.get("last_interaction")), chat_id)
+        )
+        return True
+
+    def write_chats(self, values_by_chat: dict):
+        for chat_id, values in values_by_chat.items():
+            self.write_chat(chat_id, values)
+
+    def add_chat(self, chat_id: str, chat_dict: dict):
+        self.connection.execute(
+            "INSERT OR IGNORE INTO chats (id, last_interaction, data) VALUES (?, ?, ?)",
+            (chat_id, timestamp(chat_dict.get("last_interaction")), encode(chat_dict))
+        )
+
+    def add_dialog(self, chat_id: str, dialog_id: str) -> bool:
+        if not self.write_chat(chat_id, {"current_dialog_id": dialog_id}):
+            return False
+        self.connection.execute(
+            "INSERT INTO dialogs (id, chat_id, data) VALUES (?, ?, ?)",
+            (dialog_id, chat_id, encode({constant_db_tokens: 0}))
+        )
+        return True
+
+    def read_dialog(self, chat_id: str, dialog_id: Optional[str], with_messages: bool = True):
+        if not dialog_id:
+            return None
+        row = self.connection.execute("SELECT data FROM dialogs WHERE id = ? AND chat_id = ?", (dialog_id, chat_id)).fetchone()
+        if row is None and not self.restore_dialog(chat_id, dialog_id):
+            return None
+        if row is None:
+            row = self.connection.execute("SELECT data FROM dialogs WHERE id = ?", (dialog_id,)).fetchone()
+        dialog_dict = loads(row[0])
+        dialog_dict["chat_id"] = chat_id
+        if with_messages:
+            dialog_dict["messages"] = self.read_messages(dialog_id)
+        return dialog_dict
+
+    def read_messages(self, dialog_id: str) -> list:
+        rows = self.connection.execute("SELECT data FROM messages WHERE dialog_id = ? ORDER BY position", (dialog_id,))
+        return [loads(data) for data, in rows]
+
+    def write_messages(self, dialog_id: str, dialog_messages: list):
+        self.connection.execute("DELETE FROM messages WHERE dialog_id = ?", (dialog_id,))
+        self.connection.executemany(
+            "INSERT INTO messages (dialog_id, position, data) VALUES (?, ?, ?)",
+            [(dialog_id, position, encode(message)) for position, message in enumerate(dialog_messages)]
+        )
+
+    def write_dialog(self, chat_id: str, dialog_id: Optional[str], values: dict):
+        row = self.connection.execute("SELECT data FROM dialogs WHERE id = ? AND chat_id = ?", (dialog_id, chat_id)).fetchone()
+        if row is None:
+            return
+        values = dict(values)
+        if "messages" in values:
+            self.write_messages(dialog_id, values.pop("messages"))
+        if values:
+            dialog_dict = loads(row[0])
+            dialog_dict.update(convert_datetime(values))
+            self.connection.execute("UPDATE dialogs SET data = ? WHERE id = ?", (encode(dialog_dict), dialog_id))
+
+    def delete_dialogs(self, chat_id: str, dialog_id: Optional[str]):
+        # el actual se recupera antes de borrar lo archivado
+        self.read_dialog(chat_id, dialog_id, with_messages=False)
+        self.connection.execute(
+            "DELETE FROM messages WHERE dialog_id IN (SELECT id FROM dialogs WHERE chat_id = ? AND id IS NOT ?)",
+            (chat_id, dialog_id)
+        )
+        self.connection.execute("DELETE FROM dialogs WHERE chat_id = ? AND id IS NOT ?", (chat_id, dialog_id))
+        self.connection.execute("DELETE FROM dialogs_archive WHERE chat_id = ?", (chat_id,))
+
+    def turn_context(self, chat_id: str, with_messages: bool):
+        chat_dict = self.read_chat(chat_id)
+        if chat_dict is None:
+            return None
+        return chat_dict, self.read_dialog(chat_id, chat_dict.get("current_dialog_id"), with_messages)
+
+    def push_message(self, chat_id: str, dialog_id: Optional[str], dialog_message: dict, tokens: int) -> int:
+        row = self.connection.execute("SELECT data FROM dialogs WHERE id = ? AND chat_id = ?", (dialog_id, chat_id)).fetchone()
+        if row is None:
+            # si el diálogo estaba archivado se recupera antes de agregar el mensaje
+            if not dialog_id or not self.restore_dialog(chat_id, dialog_id):
+                return 0
+            row = self.connection.execute("SELECT data FROM dialogs WHERE id = ?", (dialog_id,)).fetchone()
+        position, = self.connection.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM messages WHERE dialog_id = ?", (dialog_id,)).fetchone()
+        self.connection.execute("INSERT INTO messages (dialog_id, position, data) VALUES (?, ?, ?)", (dialog_id, position, encode(dialog_message)))
+        dialog_dict = loads(row[0])
+        dialog_dict[constant_db_tokens] = int(dialog_dict.get(constant_db_tokens) or 0) + tokens
+        if config.dialog_max_messages:
+            # los tokens de los mensajes que se caen también se descuentan
+            limit = position - config.dialog_max_messages
+            dropped = self.connection.execute("SELECT data FROM messages WHERE dialog_id = ? AND position <= ?", (dialog_id, limit)).fetchall()
+            if dropped:
+                self.connection.execute("DELETE FROM messages WHERE dialog_id = ? AND position <= ?", (dialog_id, limit))
+                dialog_dict[constant_db_tokens] = max(dialog_dict[constant_db_tokens] - sum(message_tokens(loads(data)) for data, in dropped), 0)
+        self.connection.execute("UPDATE dialogs SET data = ? WHERE id = ?", (encode(dialog_dict), dialog_id))
+        return dialog_dict[constant_db_tokens]
+
+    def trim_messages(self, chat_id: str, dialog_id: Optional[str], count: int, tokens: int):
+        self.connection.execute(
+            "DELETE FROM messages WHERE dialog_id = ? AND position IN (SELECT position FROM messages WHERE dialog_id = ? ORDER BY position LIMIT ?)",
+            (dialog_id, dialog_id, count)
+        )
+        self.write_dialog(chat_id, dialog_id, {constant_db_tokens: tokens})
+
+    def restore_dialog(self, chat_id: str, dialog_id: str) -> bool:
+        row = self.connection.execute("SELECT data FROM dialogs_archive WHERE id = ? AND chat_id = ?", (dialog_id, chat_id)).fetchone()
+        if row is None:
+            return False
+        dialog_dict = loads(zlib.decompress(row[0]))
+        self.connection.execute("INSERT OR REPLACE INTO dialogs (id, chat_id, data) VALUES (?, ?, ?)", (dialog_id, chat_id, encode(dialog_dict["data"])))
+        self.write_messages(dialog_id, dialog_dict["messages"])
+        self.connection.execute("DELETE FROM dialogs_archive WHERE id = ?", (dialog_id,))
+        return True
+
+    def archive_dialogs(self, before: float) -> int:
+        rows = self.connection.execute(
+            "SELECT dialogs.id, dialogs.chat_id, dialogs.data FROM dialogs JOIN chats ON chats.id = dialogs.chat_id WHERE chats.last_interaction < ?",
+            (before,)
+        ).fetchall()
+        for dialog_id, chat_id, data in rows:
+            archived = {"data": loads(data), "messages": self.read_messages(dialog_id)}
+            self.connection.execute(
+                "INSERT OR REPLACE INTO dialogs_archive (id, chat_id, data) VALUES (?, ?, ?)",
+                (dialog_id, chat_id, zlib.compress(dumps(archived, ensure_ascii=False).encode("utf-8")))
+            )
+            self.connection.execute("DELETE FROM messages WHERE dialog_id = ?", (dialog_id,))
+            self.connection.execute("DELETE FROM dialogs WHERE id = ?", (dialog_id,))
+        return len(rows)
+
+    async def ensure_indexes(self):
+        pass
+
+    async def compact(self, min_size: int = 0) -> bool:
+        return False
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.connection.close)
+        self.executor.shutdown(wait=True)
+
+    async def recent_chat_ids(self, limit: int) -> list:
+        rows = await self.run_io(lambda: self.connection.execute("SELECT id FROM chats ORDER BY last_interaction DESC LIMIT ?", (limit,)).fetchall())
+        return [chat_id for chat_id, in rows]
+
+    async def chat_exists(self, chat_id: str) -> bool:
+        return await self.run_io(self.read_chat, chat_id) is not None
+
+    async def insert_chat(self, chat_id: str, chat_dict: dict):
+        await self.run_io(self.add_chat, chat_id, chat_dict)
+
+    async def insert_dialog(self, chat_id: str, dialog_id: str) -> bool:
+        return await self.run_io(self.add_dialog, chat_id, dialog_id)
+
+    async def get_chat(self, chat_id: str, keys: Optional[list] = None):
+        chat_dict = await self.run_io(self.read_chat, chat_id)
+        if chat_dict is None or not keys:
+            return chat_dict
+        return {key: chat_dict.get(key, None) for key in keys}
+
+    async def update_chat(self, chat_id: str, values: dict) -> bool:
+        return await self.run_io(self.write_chat, chat_id, values)
+
+    async def update_chats(self, values_by_chat: dict):
+        await self.run_io(self.write_chats, values_by_chat)
+
+    async def get_dialog(self, chat_id: str, dialog_id: Optional[str], with_messages: bool = True):
+        return await self.run_io(self.read_dialog, chat_id, dialog_id, with_messages)
+
+    async def update_dialog(self, chat_id: str, dialog_id: Optional[str], values: dict):
+        await self.run_io(self.write_dialog, chat_id, dialog_id, values)
+
+    async def delete_dialogs_except(self, chat_id: str, dialog_id: Optional[str]):
+        await self.run_io(self.delete_dialogs, chat_id, dialog_id)
+
+    async def load_turn_context(self, chat_id: str, with_messages: bool = True):
+        return await self.run_io(self.turn_context, chat_id, with_messages)
+
+    async def push_dialog_message(self, chat_id: str, dialog_id: Optional[str], dialog_message: dict, tokens: int) -> int:
+        return await self.run_io(self.push_message, chat_id, dialog_id, dialog_message, tokens)
+
+    async def trim_dialog_messages(self, chat_id: str, dialog_id: Optional[str], count: int, tokens: int):
+        await self.run_io(self.trim_messages, chat_id, dialog_id, count, tokens)
+
+    async def archive_idle_dialogs(self, cutoff) -> int:
+        return await self.run_io(self.archive_dialogs, cutoff.timestamp())
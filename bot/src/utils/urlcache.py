@@ -0,0 +1,32 @@
+from pathlib import Path
+from time import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from .diskcache import DiskCache
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, parts.port) in (("http", 80), ("https", 443)):
+        netloc = netloc.rsplit(":", 1)[0]
+    # sin fragmento ni parámetros de seguimiento, y la query ordenada
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not key.startswith("utm_")))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+class UrlCache(DiskCache):
+    # texto ya convertido de cada url, por url normalizada
+    def __init__(self, directory: Path, max_size: int, max_bytes: int, ttl: float, memory_ttl: float):
+        super().__init__("urls", directory, max_size, max_bytes, memory_ttl)
+        self.ttl = ttl  # durante ttl no se vuelve a pedir; después se revalida con ETag/Last-Modified
+
+    def fresh(self, entry: dict) -> bool:
+        return time() - entry["checked"] < self.ttl
+
+    def new_entry(self, url: str, text: str, etag=None, last_modified=None) -> dict:
+        return {"url": normalize_url(url), "text": text, "etag": etag, "last_modified": last_modified, "checked": time(), "clean": {}}
+
+    async def get(self, url: str):
+        return await super().get(normalize_url(url))
+
+    async def put(self, entry: dict):
+        await super().put(entry["url"], entry)
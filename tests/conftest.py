@@ -0,0 +1,20 @@
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# config.py necesita el .env y los config/*.json de un despliegue; los backends solo leen estos valores
+config = types.ModuleType("bot.src.utils.config")
+config.json_layout = "single"
+config.json_journal = True
+config.json_flush_seconds = 0
+config.json_shard_cache = 500
+config.dialog_max_messages = 200
+sys.modules["bot.src.utils.config"] = config
+config.database_backend = "sqlite"
+config.cache_bus = "local"
+config.cache_max_size = 100
+config.cache_ttl_minutes = 60
+config.known_chats_cache = 100
+config.interaction_flush_seconds = 0
@@ -0,0 +1,13 @@
+from bot.src.utils import cache as cache_module
+from bot.src.utils.cache import Cache
+
+def test_get_checks_expiry_once(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: clock[0])
+    cache = Cache("test", 10, 5)
+    cache["a"] = None
+    assert cache.get("a", "falta") is None
+    clock[0] += 5
+    assert cache.get("a", "falta") == "falta"
+    assert len(cache) == 0
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from udatetime import now
+from bot.src.utils import database
+from bot.src.utils.constants import constant_db_model
+from bot.src.utils.storage import as_datetime
+from bot.src.utils.storage.sqlite import SqliteStorage
+
+@pytest.fixture
+def make_database(tmp_path, monkeypatch):
+    # todos los Database del test comparten la misma base de datos, como varios workers
+    monkeypatch.setattr(database, "create_storage", lambda backend: SqliteStorage(tmp_path / "bot.sqlite3"))
+    return database.Database
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+async def new_chat(db, chat_id="1"):
+    await db.backend.insert_chat(chat_id, {"last_interaction": now(), "current_dialog_id": None, "current_model": "gpt-4"})
+    return SimpleNamespace(id=int(chat_id))
+
+def test_failed_interaction_flush_keeps_entries(make_database, monkeypatch):
+    async def scenario():
+        db = make_database()
+        chat = await new_chat(db)
+        update_chats = db.backend.update_chats
+        async def failing(values_by_chat):
+            raise OSError("disco lleno")
+        monkeypatch.setattr(db.backend, "update_chats", failing)
+        value = now()
+        await db.set_last_interaction(chat, value)
+        await asyncio.sleep(0.05)
+        assert db.interactions == {"1": value}
+
+        # el siguiente intento guarda lo pendiente
+        monkeypatch.setattr(db.backend, "update_chats", update_chats)
+        await asyncio.sleep(0.05)
+        assert db.interactions == {}
+        assert as_datetime((await db.backend.get_chat("1", ["last_interaction"]))["last_interaction"]) == value
+        await db.close()
+    run(scenario)
+
+def test_bus_invalidates_settings_on_other_workers(make_database):
+    async def scenario():
+        writer, reader = make_database(), make_database()
+        chat = await new_chat(writer)
+        assert (await reader.load_settings(chat)).model == "gpt-4"
+        await writer.set_chat_attribute(chat, constant_db_model, "gpt-3.5-turbo")
+        # lo mismo que tasks/bus.py con cada aviso
+        chat_id, keys = await asyncio.wait_for(reader.bus.listen().__anext__(), 1)
+        assert (chat_id, keys) == (chat.id, [constant_db_model])
+        reader.invalidate_settings(chat_id)
+        assert reader.settings.get(chat.id) is None
+        assert (await reader.load_settings(chat)).model == "gpt-3.5-turbo"
+
+        # las claves que ningún worker tiene en caché no se avisan
+        await writer.set_chat_attribute(chat, "user_names", {"7": "Ana"})
+        assert reader.bus.queue.empty()
+        await writer.close()
+        await reader.close()
+    run(scenario)
@@ -0,0 +1,24 @@
+from pathlib import Path
+from bot.src.utils import imagestore
+from bot.src.utils.imagestore import ImageStore
+
+def test_spilled_images_are_removed(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(imagestore, "monotonic", lambda: clock[0])
+    store = ImageStore("test", 10, 60, max_ram=4)
+    store.put("1", [(b"12345", "a.png")])
+    store.put("2", [(b"12345", "b.png")])
+    (first, _), = store.get("1")
+    assert isinstance(first, Path) and first.exists()
+    directory = Path(store.directory.name)
+
+    # al expirar se borra su archivo
+    clock[0] += 60
+    assert store.sweep() == 2
+    assert not first.exists()
+
+    # al cerrar se borra la carpeta
+    store.put("3", [(b"12345", "c.png")])
+    store.close()
+    assert not directory.exists()
+    assert len(store) == 0
@@ -0,0 +1,174 @@
+import asyncio
+import os
+from datetime import timedelta
+import pytest
+from udatetime import now
+from bot.src.utils import config
+from bot.src.utils.constants import constant_db_tokens
+from bot.src.utils.storage.jsonfile import JsonStorage
+from bot.src.utils.storage.sqlite import SqliteStorage
+
+LAYOUTS = {
+    "json": {"json_layout": "single", "json_journal": False},
+    "json-journal": {"json_layout": "single", "json_journal": True},
+    "json-sharded": {"json_layout": "sharded", "json_journal": False},
+    "sqlite": {},
+}
+
+@pytest.fixture(params=list(LAYOUTS))
+def open_storage(request, tmp_path, monkeypatch):
+    for key, value in LAYOUTS[request.param].items():
+        monkeypatch.setattr(config, key, value)
+    if request.param == "sqlite":
+        return lambda: SqliteStorage(tmp_path / "bot.sqlite3")
+    return lambda: JsonStorage(tmp_path)
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+def message(text, tokens):
+    return {"user": text, "tokens": {"user": tokens - 3}}
+
+async def new_chat(storage, chat_id="1", dialog_id="d1", last_interaction=None):
+    await storage.insert_chat(chat_id, {"last_interaction": last_interaction or now(), "current_dialog_id": None, "current_model": "gpt-4"})
+    assert await storage.insert_dialog(chat_id, dialog_id)
+
+def texts(dialog_dict):
+    return [dialog_message["user"] for dialog_message in dialog_dict["messages"]]
+
+def test_chat_round_trip(open_storage):
+    async def scenario():
+        storage = open_storage()
+        await new_chat(storage)
+        assert await storage.chat_exists("1")
+        assert not await storage.chat_exists("2")
+        assert await storage.update_chat("1", {"current_model": "gpt-3.5-turbo"})
+        assert not await storage.update_chat("2", {"current_model": "gpt-3.5-turbo"})
+        assert await storage.get_chat("1", ["current_model", "current_dialog_id"]) == {"current_model": "gpt-3.5-turbo", "current_dialog_id": "d1"}
+        assert await storage.get_chat("2") is None
+        # una clave con punto cambia solo esa entrada
+        assert await storage.update_chat("1", {"user_names.7": "Ana"})
+        assert await storage.update_chat("1", {"user_names.8": "Beto"})
+        await storage.close()
+
+        storage = open_storage()
+        chat_dict = await storage.get_chat("1", ["current_model", "user_names"])
+        assert chat_dict == {"current_model": "gpt-3.5-turbo", "user_names": {"7": "Ana", "8": "Beto"}}
+        await storage.close()
+    run(scenario)
+
+def test_push_and_trim(open_storage):
+    async def scenario():
+        storage = open_storage()
+        await new_chat(storage)
+        for index in range(4):
+            total = await storage.push_dialog_message("1", "d1", message(f"m{index}", 10), 10)
+        assert total == 40
+        await storage.trim_dialog_messages("1", "d1", 3, 10)
+        await storage.close()
+
+        storage = open_storage()
+        dialog_dict = await storage.get_dialog("1", "d1")
+        assert texts(dialog_dict) == ["m3"]
+        assert dialog_dict[constant_db_tokens] == 10
+        assert await storage.push_dialog_message("1", "missing", message("m", 10), 10) == 0
+        await storage.close()
+    run(scenario)
+
+def test_push_cap_subtracts_dropped_tokens(open_storage, monkeypatch):
+    monkeypatch.setattr(config, "dialog_max_messages", 3)
+    async def scenario():
+        storage = open_storage()
+        await new_chat(storage)
+        for index, tokens in enumerate([5, 7, 11, 13, 17]):
+            total = await storage.push_dialog_message("1", "d1", message(f"m{index}", tokens), tokens)
+        assert total == 11 + 13 + 17
+        assert texts(await storage.get_dialog("1", "d1")) == ["m2", "m3", "m4"]
+        await storage.close()
+    run(scenario)
+
+def test_archive_and_restore(open_storage, tmp_path):
+    async def scenario():
+        storage = open_storage()
+        await new_chat(storage, "idle", "old", now() - timedelta(days=40))
+        await new_chat(storage, "active", "live")
+        await storage.push_dialog_message("idle", "old", message("hola", 10), 10)
+        await storage.push_dialog_message("active", "live", message("hey", 10), 10)
+        await storage.close()
+
+        # con shards la inactividad sale del mtime de chat.json
+        idle_chat = tmp_path / "chats" / "idle" / "chat.json"
+        if idle_chat.exists():
+            old = (now() - timedelta(days=40)).timestamp()
+            os.utime(idle_chat, (old, old))
+
+        storage = open_storage()
+        # los chats con shards recién leídos siguen en memoria; se archiva desde un arranque limpio
+        assert await storage.archive_idle_dialogs(now() - timedelta(days=30)) == 1
+        assert texts(await storage.get_dialog("active", "live")) == ["hey"]
+        await storage.close()
+
+        storage = open_storage()
+        # un mensaje que llega sin leer antes el diálogo también lo recupera
+        assert await storage.push_dialog_message("idle", "old", message("volví", 10), 10) == 20
+        assert texts(await storage.get_dialog("idle", "old")) == ["hola", "volví"]
+        await storage.close()
+
+        storage = open_storage()
+        assert texts(await storage.get_dialog("idle", "old")) == ["hola", "volví"]
+        await storage.close()
+    run(scenario)
+
+def test_delete_dialogs_except_current(open_storage):
+    async def scenario():
+        storage = open_storage()
+        await new_chat(storage, "1", "d1")
+        assert await storage.insert_dialog("1", "d2")
+        await storage.push_dialog_message("1", "d2", message("actual", 10), 10)
+        await storage.delete_dialogs_except("1", "d2")
+        assert await storage.get_dialog("1", "d1") is None
+        assert texts(await storage.get_dialog("1", "d2")) == ["actual"]
+        await storage.close()
+    run(scenario)
+
+def test_turn_context(open_storage):
+    async def scenario():
+        storage = open_storage()
+        await new_chat(storage)
+        await storage.push_dialog_message("1", "d1", message("hola", 10), 10)
+        chat_dict, dialog_dict = await storage.load_turn_context("1")
+        assert chat_dict["current_dialog_id"] == "d1"
+        assert texts(dialog_dict) == ["hola"]
+        assert await storage.load_turn_context("2") is None
+        await storage.close()
+    run(scenario)
+
+def test_compact(open_storage, request):
+    async def scenario():
+        storage = open_storage()
+        await new_chat(storage)
+        await storage.push_dialog_message("1", "d1", message("hola", 10), 10)
+        # solo el JSON con journal tiene algo que compactar, y solo si pasa del tamaño pedido
+        assert not await storage.compact(1 << 30)
+        assert await storage.compact() == (request.node.callspec.params["open_storage"] == "json-journal")
+        await storage.close()
+
+        storage = open_storage()
+        assert texts(await storage.get_dialog("1", "d1")) == ["hola"]
+        await storage.close()
+    run(scenario)
+
+def test_json_migrates_to_shards(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "json_journal", True)
+    async def scenario():
+        storage = JsonStorage(tmp_path)
+        await new_chat(storage)
+        await storage.push_dialog_message("1", "d1", message("hola", 10), 10)
+        await storage.close()
+
+        monkeypatch.setattr(config, "json_layout", "sharded")
+        storage = JsonStorage(tmp_path)
+        assert (tmp_path / "chats" / "1" / "d1.json").exists()
+        assert texts(await storage.get_dialog("1", "d1")) == ["hola"]
+        await storage.close()
+    run(scenario)